@@ -1,5 +1,12 @@
 import math
+import time
+import queue
+import asyncio
+import itertools
 import threading
+from functools import partial
+from collections import deque
+from concurrent.futures import Future
 
 import gi
 gi.require_version('Gtk', '3.0')
@@ -8,6 +15,7 @@ from gi.repository import GLib
 
 from octopyclient.utils import *
 from octopyclient.igtk import *
+from octopyclient.octorest.octorest import deadline, critical
 
 class Singleton(type):
     _instances = {}
@@ -25,6 +33,14 @@ class Config:
     width:      int     # Display size
     height:     int
     preset:     str     # Default temperature preset
+    aio:        bool = False    # Run under GLib-backed asyncio loop
+    json:       str = None      # JSON decoder backend (default: fastest installed)
+    compress:   bool = False    # Request compressed replies
+    budget:     tuple = None    # Request budget (requests/sec, in-flight)
+    worker:     bool = False    # OctoRest in a separate network process
+    transport:  str = None      # HTTP client: requests (default) or direct (urllib3)
+    mqtt:       str = None      # MQTT broker [user:password@]host[:port] of OctoPrint-MQTT
+    mqtt_base:  str = 'octoPrint/'  # OctoPrint-MQTT base topic
 
 class TimerTask(threading.Timer):
     def __init__(self, name, interval, callback, event):
@@ -40,23 +56,264 @@ class TimerTask(threading.Timer):
         self.stopped.clear()
         log.info("Timer thread: {:s} - exit".format(self.getName()))
 
+def takeResult(result):
+    # Unwrap a RestExecutor result - re-raise the request's exception on failure
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+def installGLibLoop():
+    # Make asyncio run on the GLib main loop (driven by Gtk.main)
+    # PyGObject >= 3.50 provides gi.events, older releases need gbulb
+    try:
+        from gi.events import GLibEventLoopPolicy
+        asyncio.set_event_loop_policy(GLibEventLoopPolicy())
+        return True
+    except ImportError:
+        pass
+    try:
+        import gbulb
+        gbulb.install(gtk=True)
+        return True
+    except ImportError:
+        return False
+
+# Latency samples (sec) - summary logged at DEBUG every 'every' samples
+class LatencyStats():
+    def __init__(self, name, every=60, window=1000):
+        self.name = name
+        self.every = every
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, delay):
+        with self.lock:
+            self.samples.append(delay)
+            self.count += 1
+            report = self.count % self.every == 0
+        if report:
+            log.debug("{:s} latency: {:s}".format(self.name, self.summary()))
+
+    def percentile(self, pct):
+        # Over the last 'window' samples - None if no samples yet
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(pct / 100 * len(samples)))]
+
+    def summary(self):
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return "no samples"
+        pct = lambda p: 1000 * samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+        return "n {:d}, mean {:.1f}ms, p95 {:.1f}ms, p99 {:.1f}ms, max {:.1f}ms".format(
+            len(samples), 1000 * sum(samples) / len(samples), pct(95), pct(99), 1000 * samples[-1])
+
+def _bounded(request, expires):
+    # Run request under the deadline set when it was submitted
+    with deadline(expires - time.monotonic()):
+        return request()
+
+def _reserved(request):
+    # Run request over the client's reserved connection
+    with critical():
+        return request()
+
+# Request priorities - lower runs first
+CRITICAL = 0      # Cancel, emergency stop - has a reserved worker/connection
+USER = 1          # Commands from panel buttons
+BACKGROUND = 2    # Status polling - shed when the queue is long
+
+PRIORITY_NAMES = {CRITICAL: "critical", USER: "user", BACKGROUND: "background"}
+
+# G-codes sent at CRITICAL priority
+EMERGENCY_GCODES = ("M112", "M410")
+
+def gcodePriority(cmds):
+    if isinstance(cmds, str):
+        cmds = [cmds]
+    if any(c.strip().upper().startswith(EMERGENCY_GCODES) for c in cmds):
+        return CRITICAL
+    return USER
+
+class RequestShed(RuntimeError):
+    pass
+
+class _Job():
+    def __init__(self, request, priority):
+        self.request = request
+        self.priority = priority
+        self.future = Future()
+        self.submitted = time.monotonic()
+        self.claim = threading.Lock()
+
+# Prioritized worker pool for OctoRest calls. Requests run on the pool,
+# only the decoded results are handed back to the GTK main loop.
+# One extra worker only runs CRITICAL requests. These go over the
+# client's reserved connection (see: OctoRest.reserve): the session
+# pool of 'connections' is shared with cache refreshes, push logins
+# and main loop calls, a free connection there is not guaranteed.
+class RestExecutor():
+    def __init__(self, workers=4, shedAt=None):
+        self.workers = workers
+        self.connections = workers + 1
+        # Background requests are refused with this many requests queued
+        self.shedAt = shedAt if shedAt is not None else 2 * workers
+        self.queue = queue.PriorityQueue()
+        self.reserved = queue.Queue()
+        # Jobs waiting in 'queue' - not the copies of CRITICAL ones
+        self.waiting = 0
+        self.lock = threading.Lock()
+        self.seq = itertools.count()
+        self.shed = 0
+        self.dispatch = LatencyStats("idle_add dispatch")
+        # Submit to completion, per priority
+        self.latency = {p: LatencyStats("{:s} request".format(n)) for p, n in PRIORITY_NAMES.items()}
+        self.threads = []
+        for i in range(workers):
+            self.threads.append(self._worker("octorest_{:d}".format(i), self.queue))
+        self.threads.append(self._worker("octorest_critical", self.reserved))
+
+    def _worker(self, name, q):
+        thread = threading.Thread(target=self._work, args=(q,), name=name, daemon=True)
+        thread.start()
+        return thread
+
+    def _work(self, q):
+        while True:
+            job = q.get()[2]
+            if job is None:
+                return
+            if job.priority != CRITICAL:
+                with self.lock:
+                    self.waiting -= 1
+            # CRITICAL jobs are queued twice - first free worker runs it
+            if not job.claim.acquire(blocking=False):
+                continue
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                job.future.set_result(job.request())
+            except Exception as err:
+                job.future.set_exception(err)
+            self.latency[job.priority].add(time.monotonic() - job.submitted)
+
+    def submit(self, request, priority=BACKGROUND):
+        if priority == CRITICAL:
+            request = partial(_reserved, request)
+        job = _Job(request, priority)
+        if priority == BACKGROUND and self.waiting >= self.shedAt:
+            self.shed += 1
+            job.future.set_exception(RequestShed("Request shed - queue full"))
+            return job.future
+
+        entry = (priority, next(self.seq), job)
+        if priority == CRITICAL:
+            self.reserved.put(entry)
+        else:
+            with self.lock:
+                self.waiting += 1
+        self.queue.put(entry)
+        return job.future
+
+    def run(self, requests, callback=None, timeout=None, priority=BACKGROUND):
+        # requests: {name: callable} - all are issued concurrently.
+        # callback({name: result or exception}) is invoked on the main loop
+        # once the last one completes.
+        # timeout (sec) bounds the total time of the OctoRest calls made by
+        # the requests, counted from now (RequestTimeout when exceeded)
+        results = {}
+        if not requests:
+            if callback is not None:
+                GLib.idle_add(self._deliver, callback, results, time.monotonic())
+            return
+
+        pending = [len(requests)]
+        lock = threading.Lock()
+
+        def done(name, future):
+            try:
+                results[name] = future.result()
+            except Exception as err:
+                results[name] = err
+            with lock:
+                pending[0] -= 1
+                last = pending[0] == 0
+            if last and callback is not None:
+                GLib.idle_add(self._deliver, callback, results, time.monotonic())
+
+        expires = time.monotonic() + timeout if timeout is not None else None
+        for name, request in requests.items():
+            if expires is not None:
+                request = partial(_bounded, request, expires)
+            future = self.submit(request, priority)
+            future.add_done_callback(lambda f, n=name: done(n, f))
+
+    def _deliver(self, callback, results, completed):
+        self.dispatch.add(time.monotonic() - completed)
+        callback(results)
+        # One-shot idle callback
+        return False
+
+    def stats(self):
+        # Per priority latency summary and shed count
+        lines = ["{:s}: {:s}".format(PRIORITY_NAMES[p], l.summary()) for p, l in self.latency.items()]
+        return "{:s}; shed {:d}".format("; ".join(lines), self.shed)
+
+    def shutdown(self):
+        for thread in self.threads:
+            self.queue.put((BACKGROUND + 1, next(self.seq), None))
+        self.reserved.put((BACKGROUND + 1, next(self.seq), None))
+
 class BackgroundTask():
-    def __init__(self, name, interval, idleTask, ui=None):
+    def __init__(self, name, interval, idleTask, ui=None, fetch=None, timeout=None):
         self.stopFlag = threading.Event()
         self.idleTask = idleTask
         self.lock = threading.Lock()
         self.interval = interval
         self.name = name
+        # Optional request builder - {name: callable} run on the executor,
+        # results are passed to idleTask
+        self.fetch = fetch
+        self.timeout = timeout
+        self.executor = ui.executor if ui is not None else None
+        self.busy = threading.Event()
+        self.active = False
         # Add to timer thread rundown list in UI
         if ui is not None:
             ui.addRundown(self)
 
     def queueIt(self):
-        return GLib.idle_add(self.idleTask)
+        if self.fetch is None or self.executor is None:
+            return GLib.idle_add(self.idleTask)
+
+        # Skip this tick if the previous one has not completed yet
+        if self.busy.is_set():
+            log.debug("Background task: {:s} - overrun".format(self.name))
+            return
+        self.busy.set()
+        try:
+            requests = self.fetch()
+        except Exception as err:
+            self.busy.clear()
+            log.error("Background task: {:s} - {}".format(self.name, str(err)))
+            return
+        self.executor.run(requests, self.complete, self.timeout)
+
+    def complete(self, results):
+        self.busy.clear()
+        # Discard results arriving after cancel
+        if not self.active:
+            return
+        self.idleTask(results)
 
     def start(self, source=None):
         # Invoke callback immediately. Timer queues callback after 1st interval
-        GLib.idle_add(self.idleTask)
+        self.active = True
+        self.queueIt()
 
         with self.lock:
             self.thread = TimerTask(self.name, self.interval, self.queueIt, self.stopFlag)
@@ -65,6 +322,7 @@ class BackgroundTask():
             return
 
     def cancel(self):
+        self.active = False
         with self.lock:
             try:
                 if self.thread.isAlive():
@@ -75,6 +333,86 @@ class BackgroundTask():
                 pass
             return
 
+def _stamped(request):
+    # Executor side of AsyncBackgroundTask - result and completion time
+    try:
+        return request(), time.monotonic()
+    except Exception as err:
+        return err, time.monotonic()
+
+# BackgroundTask as a coroutine on the GLib-backed asyncio loop (see: installGLibLoop)
+# No timer thread - the loop sleeps between ticks and callbacks run directly on it
+class AsyncBackgroundTask():
+    def __init__(self, name, interval, idleTask, ui=None, fetch=None, timeout=None):
+        self.name = name
+        self.interval = interval
+        self.idleTask = idleTask
+        self.fetch = fetch
+        self.timeout = timeout
+        self.executor = ui.executor if ui is not None else None
+        self.dispatch = LatencyStats("asyncio dispatch")
+        self.loop = asyncio.get_event_loop()
+        self.task = None
+        self.busy = False
+        self.active = False
+        # Add to rundown list in UI
+        if ui is not None:
+            ui.addRundown(self)
+
+    async def run(self):
+        log.info("Background task: {:s} - started".format(self.name))
+        while True:
+            await asyncio.sleep(self.interval)
+            self.queueIt()
+
+    def queueIt(self):
+        if self.fetch is None or self.executor is None:
+            self.loop.call_soon(self.idleTask)
+            return
+
+        # Skip this tick if the previous one has not completed yet
+        if self.busy:
+            log.debug("Background task: {:s} - overrun".format(self.name))
+            return
+        try:
+            requests = self.fetch()
+        except Exception as err:
+            log.error("Background task: {:s} - {}".format(self.name, str(err)))
+            return
+        self.busy = True
+        self.loop.create_task(self.refresh(requests))
+
+    async def refresh(self, requests):
+        try:
+            names = list(requests)
+            if self.timeout is not None:
+                expires = time.monotonic() + self.timeout
+                requests = {n: partial(_bounded, r, expires) for n, r in requests.items()}
+            done = await asyncio.gather(*[asyncio.wrap_future(self.executor.submit(partial(_stamped, requests[n])))
+                                          for n in names], return_exceptions=True)
+        finally:
+            self.busy = False
+        # Shed requests never ran
+        done = [d if isinstance(d, tuple) else (d, time.monotonic()) for d in done]
+        if done:
+            self.dispatch.add(time.monotonic() - max(t for r, t in done))
+        # Discard results arriving after cancel
+        if self.active:
+            self.idleTask({n: r for n, (r, t) in zip(names, done)})
+
+    def start(self, source=None):
+        self.active = True
+        self.queueIt()
+        if self.task is None:
+            self.task = self.loop.create_task(self.run())
+
+    def cancel(self):
+        self.active = False
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+            log.info("Background task: {:s} - exit".format(self.name))
+
 class CommonPanel:
     panelH:     int
     panelW:     int
@@ -152,11 +490,16 @@ class LogHandler(logging.Handler):
         self.evt = None
 
     def handle(self, record):
+        # Pop-ups must be created on the GTK main thread
+        if threading.current_thread() is not threading.main_thread():
+            GLib.idle_add(self.handle, record)
+            return False
+
         # Warnings and Errors only
         # Make sure there isn't another error showing (avoid recursion)
         if (record.levelno < logging.WARNING) or \
                 (self.evt is not None):
-            return
+            return False
 
         # WARNINGS get 4sec, ERRORS 10sec
         dpyTime = 4.0 if record.levelno == logging.WARNING else 10.0
@@ -178,6 +521,7 @@ class LogHandler(logging.Handler):
         # Start timer thread to destroy pop-up
         self.tt = threading.Timer(dpyTime, self.buttonPressed)
         self.tt.start()
+        return False
 
     # Note: This function may be called by a timer thread or the main thread
     def buttonPressed(self, parent=None, button=None):
@@ -0,0 +1,231 @@
+# OctoPrint connection state machine - owns the OctoRest client
+
+import time
+import random
+import threading
+
+import gi
+gi.require_version('Gtk', '3.0')
+from gi.repository import GLib
+
+from octopyclient.common import USER, takeResult
+from octopyclient.utils import *
+from .octorest.octorest import OctoRest, make_transport
+from .octorest.budget import RequestBudget
+from .octorest.push import OctoPush
+from .octorest.mqtt import OctoMqtt
+from .octorest.worker import NetworkWorker
+
+# Backoff (sec) - jittered exponential, between BACKOFF_BASE and BACKOFF_CAP
+BACKOFF_BASE = 2
+BACKOFF_CAP = 60
+# Consecutive failed poll ticks opening the circuit while connected
+FAIL_THRESHOLD = 3
+# Time (sec) given to a printer connect before it may be retried
+PRINTER_CONNECT_WAIT = 15
+
+# Server link states published to listeners
+DISCONNECTED = 'disconnected'   # No client yet
+CONNECTING = 'connecting'       # Opening client
+CONNECTED = 'connected'         # Circuit closed
+BACKOFF = 'backoff'             # Circuit open - no requests until retry time
+PROBING = 'probing'             # Half-open - one tick decides
+# Printer link states
+PRINTER_CONNECTING = 'printer_connecting'
+PRINTER_OFFLINE = 'printer_offline'
+
+def open_client(url, key, connections=5, decoder=None, compress=False, transport=None):
+    # Keep-alive connections, one per executor worker, and one
+    # reserved for CRITICAL requests (cancel, emergency stop)
+    client = OctoRest(url=url, apikey=key, transport=make_transport(transport, connections),
+                      decoder=decoder, compress=compress)
+    client.reserve(make_transport(transport, 1))
+    return client
+
+def open_push(client):
+    # Push updates are optional - poll if websocket-client is missing
+    try:
+        push = OctoPush(client)
+        push.start()
+        return push
+    except Exception as err:
+        log.info("Push updates disabled: {}".format(str(err)))
+        return None
+
+def open_mqtt(client, broker, base, listener):
+    # MQTT state is optional as well - push or poll if it cannot start
+    try:
+        source = OctoMqtt(client, broker, base=base, listener=listener)
+        source.start()
+        return source
+    except Exception as err:
+        log.info("MQTT state disabled: {}".format(str(err)))
+        return None
+
+def backoff(attempts):
+    # "Equal jitter" - half fixed, half random
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempts)
+    return random.uniform(delay / 2, delay)
+
+class ConnectionManager():
+    def __init__(self, ui):
+        self.ui = ui
+        self.client = None
+        self.push = None
+        self.mqtt = None
+        # Optional network process - client calls go to it (see: open)
+        self.worker = None
+        cfg = ui.config
+        if cfg.worker:
+            self.worker = NetworkWorker(ui._host, cfg.api_key, connections=ui.executor.connections,
+                                        decoder=cfg.json, compress=cfg.compress, budget=cfg.budget,
+                                        transport=cfg.transport)
+        self.state = DISCONNECTED
+        self.reason = None
+        self.lock = threading.Lock()
+        self.listeners = []
+        # Server link
+        self.failures = 0
+        self.retryAt = 0.0
+        # Printer link
+        self.printerBusy = False
+        self.printerAttempts = 0
+        self.printerRetryAt = 0.0
+
+    def listen(self, callback):
+        # callback(state, reason) on the main loop for every transition
+        self.listeners.append(callback)
+
+    def publish(self, state, reason=None):
+        if state == self.state and reason == self.reason:
+            return
+        log.info("Connection: {:s}{}".format(state, " - " + reason if reason else ""))
+        self.state = state
+        self.reason = reason
+        for callback in self.listeners:
+            GLib.idle_add(lambda cb=callback: cb(state, reason) and False)
+
+    def statusSource(self):
+        # Live MQTT, push or worker snapshot if connected, else poll OctoPrint
+        if self.mqtt is not None and self.mqtt.is_live:
+            return self.mqtt
+        if self.push is not None and self.push.is_live:
+            return self.push
+        if self.worker is not None and self.client is not None and self.worker.source.is_live:
+            return self.worker.source
+        return self.client
+
+    def allow(self):
+        # Timer thread - may the store send requests this tick?
+        with self.lock:
+            if self.state == DISCONNECTED:
+                self.publish(CONNECTING)
+            elif self.state == BACKOFF:
+                if time.monotonic() < self.retryAt:
+                    return False
+                # Retry time reached - one attempt (half-open)
+                self.publish(CONNECTING if self.client is None else PROBING)
+            return True
+
+    def open(self):
+        # Executor thread - open client and get printer state
+        cfg = self.ui.config
+        if self.worker is not None:
+            self.worker.open()
+            client = self.worker.client
+        else:
+            client = open_client(self.ui._host, cfg.api_key, self.ui.executor.connections,
+                                 cfg.json, cfg.compress, cfg.transport)
+        try:
+            pState = client.state()
+        except Exception as err:
+            pState = err
+        return client, pState
+
+    def opened(self, client):
+        self.client = client
+        # The worker sets its own budget and publishes state itself
+        if self.worker is None:
+            if self.ui.config.budget is not None:
+                client.budget = RequestBudget(*self.ui.config.budget)
+            if self.ui.config.mqtt is not None:
+                self.mqtt = open_mqtt(client, self.ui.config.mqtt, self.ui.config.mqtt_base, self.pushed)
+            # Also while MQTT is not live (broker or plugin down, not seeded yet)
+            self.push = open_push(client)
+        self.succeeded()
+
+    def pushed(self, slices):
+        # MQTT thread - show the slices a message changed now, not on the next tick
+        GLib.idle_add(lambda: self.ui.store.refresh(slices) and False)
+
+    def record(self, results):
+        # Main loop - outcome of one poll tick (shed/throttled already removed)
+        if not results:
+            return
+        conn = results.get('connection')
+        if self.client is None:
+            if isinstance(conn, Exception):
+                self.failed(conn)
+            return
+        # Unreachable server: only network errors, no HTTP reply at all
+        if all(isinstance(v, OSError) for v in results.values()):
+            self.failed(next(iter(results.values())))
+        else:
+            self.succeeded()
+
+    def succeeded(self):
+        with self.lock:
+            self.failures = 0
+            self.retryAt = 0.0
+            self.publish(CONNECTED)
+
+    def failed(self, err):
+        with self.lock:
+            self.failures += 1
+            if self.client is not None and self.failures < FAIL_THRESHOLD and self.state != PROBING:
+                return
+            attempts = self.failures if self.client is None else self.failures - FAIL_THRESHOLD
+            delay = backoff(max(0, attempts))
+            self.retryAt = time.monotonic() + delay
+            self.publish(BACKOFF, "{:s} - retry in {:.0f}s".format(errToUser(err), delay))
+
+    def reset(self):
+        # Manual retry - drop backoff
+        with self.lock:
+            self.failures = 0
+            self.retryAt = 0.0
+            self.printerAttempts = 0
+            self.printerRetryAt = 0.0
+
+    def connectPrinter(self):
+        # Printer reports offline - connect unless one is under way or backing off
+        if self.printerBusy or time.monotonic() < self.printerRetryAt:
+            return
+        log.info("Attempting to connect to printer")
+        self.printerBusy = True
+        self.publish(PRINTER_CONNECTING)
+        self.ui.executor.run({'connect': self.client.connect}, self.connectDone, priority=USER)
+
+    def connectDone(self, results):
+        self.printerBusy = False
+        self.printerAttempts += 1
+        try:
+            takeResult(results['connect'])
+            # Accepted - state moves through Opening/Connecting, give it time
+            self.printerRetryAt = time.monotonic() + max(PRINTER_CONNECT_WAIT, backoff(self.printerAttempts))
+        except Exception as err:
+            delay = backoff(self.printerAttempts)
+            self.printerRetryAt = time.monotonic() + delay
+            self.publish(PRINTER_OFFLINE, "{:s} - retry in {:.0f}s".format(errToUser(err), delay))
+
+    def printerReady(self):
+        self.printerAttempts = 0
+        self.printerRetryAt = 0.0
+
+    def stop(self):
+        if self.mqtt is not None:
+            self.mqtt.stop()
+        if self.push is not None:
+            self.push.stop()
+        if self.worker is not None:
+            self.worker.stop()
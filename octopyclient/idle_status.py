@@ -1,10 +1,12 @@
 # Printer is idle - show status
 
+from functools import partial
+
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 
-from octopyclient.common import BackgroundTask, Singleton
+from octopyclient.common import Singleton, takeResult
 from .panels.files import FilesPanel
 from octopyclient.igtk import *
 from .menu import *
@@ -14,7 +16,7 @@ class IdleStatusPanel(CommonPanel, metaclass=Singleton):
     def __init__(self, ui):
         CommonPanel.__init__(self, ui)
         log.debug("IdleStatusPanel created")
-        self.bkgnd = BackgroundTask('temperature_update', 2, self.update, ui)
+        self.bkgnd = ui.store.subscribe('temperature_update', self.update, 'printer')
         # Specify menu buttons
         menuItems = getDefaultMenu(ui.config.width)
         buttons = Gtk.Grid()
@@ -31,8 +33,8 @@ class IdleStatusPanel(CommonPanel, metaclass=Singleton):
     def showFiles(self, source):
         self.ui.OpenPanel(FilesPanel(self.ui), self)
 
-    def update(self):
-        self.updateTemperature()
+    def update(self, snapshot):
+        self.updateTemperature(snapshot['printer'])
 
     def showTools(self, ui):
         if ui.getToolCount() > 1 and not ui.isSharedNozzle():
@@ -49,9 +51,9 @@ class IdleStatusPanel(CommonPanel, metaclass=Singleton):
         g.attach(self.extruder.button, 0, 0, 2, 1)
         g.attach(self.bed.button, 0, 1, 2, 1)
 
-    def updateTemperature(self):
+    def updateTemperature(self, result):
         try:
-            printer_state = self.ui.printer.printer(exclude=['sd', 'state'])
+            printer_state = takeResult(result)
             if printer_state['temperature']:
                 self.bed.SetTemperatures(printer_state['temperature']['bed']['actual'],
                                          printer_state['temperature']['bed']['target'])
@@ -90,10 +92,10 @@ class Tool:
 
         if self.name == "Bed":
             # Bed target heatup request
-            self._ui.printer.bed_target(target)
+            self._ui.command("Bed heatup", partial(self._ui.printer.bed_target, target))
         else:
             # Extruder heatup
-            self._ui.printer.tool_target(target)
+            self._ui.command("Extruder heatup", partial(self._ui.printer.tool_target, target))
 
     def updateStatus(self, heating):
         ctx = self.button.get_style_context()
@@ -138,6 +138,7 @@ class PressedButton:
     b:          Gtk.Button  # associated button
     pcb:        Callable[..., None] # pressed interval callback
     cbint:      int         # callback interval (ms)
+    pending:    bool = False    # request of the last tick in flight (see: UI.command)
 
 def createPressedButton(label, image, ms, pressed, param=None):
     btn = ButtonImageScaled(label, image, IMAGE_SIZE_NORMAL, None)
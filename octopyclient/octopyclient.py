@@ -4,6 +4,7 @@
   octopyclient [opts] [server]
 
 Hostname or IP of OctoPrint server installation (default: localhost:5000)
+or unix:///path/to/socket of a local proxy in front of OctoPrint
 
 Command-line opts:
 
@@ -16,6 +17,13 @@ Command-line opts:
 -c, --config      Location of Octoprint configuration (default: $HOME/.octoprint/config.yaml)
 -p, --preset      Default temperature preset from OctoPrint (default: PLA)
     --noblank     Disable DPMS and screen-saver blanking
+    --asyncio     Run background polling on an asyncio loop driven by GTK
+    --json        JSON decoder [json, orjson, ujson] (default: fastest installed)
+    --compress    Request gzip/deflate compressed replies (remote/Wi-Fi connections)
+    --budget      Polling budget RPS[/INFLIGHT] when sharing a Pi with OctoPrint (ex: 3/2)
+    --worker      Run OctoPrint requests in a separate network process
+    --transport   HTTP client [requests, direct] (default: requests)
+    --mqtt        State from OctoPrint-MQTT on broker [user:password@]host[:port]
 """
 
 __version__ = "1.0.2"
@@ -32,7 +40,9 @@ from gi.repository import Gtk
 
 from .ui import UI
 from .utils import getStylePath, setStyleBase
-from .common import Config
+from .common import Config, installGLibLoop
+from .octorest.decoder import get_decoder
+from .octorest.mqtt import parse_broker
 
 def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
@@ -94,6 +104,11 @@ def readConfigFile(configFile, cfg):
     except (AttributeError, KeyError):
         pass
 
+    try:
+        cfg.mqtt_base = yml['plugins']['mqtt']['publish']['baseTopic']
+    except (AttributeError, KeyError, TypeError):
+        pass
+
     return
 
 def dpyNoBlank(screen):
@@ -109,7 +124,9 @@ def main(argv=None):
     try:
         try:
             opts, args = getopt.getopt(argv[1:], "hl:f:k:s:r:c:p:", ["help", "loglevel=", "log=", "key=",
-                                                                "style=", "resolution=", "config=", "preset=", "noblank"])
+                                                                "style=", "resolution=", "config=", "preset=", "noblank",
+                                                                "asyncio", "json=", "compress", "budget=", "worker", "transport=",
+                                                                "mqtt="])
         except getopt.error as msg:
             raise Usage(msg)
 
@@ -154,6 +171,36 @@ def main(argv=None):
                 cfg.profile = v
             elif o == '--noblank':
                 dpyNoBlank(os.getenv('DISPLAY'))
+            elif o == '--asyncio':
+                cfg.aio = True
+            elif o == '--json':
+                try:
+                    get_decoder(v)
+                except ValueError as err:
+                    raise Usage(str(err))
+                cfg.json = v
+            elif o == '--compress':
+                cfg.compress = True
+            elif o == '--budget':
+                try:
+                    limits = v.split('/')
+                    cfg.budget = (float(limits[0]), int(limits[1]) if len(limits) > 1 else 2)
+                    if cfg.budget[0] <= 0 or cfg.budget[1] < 1:
+                        raise ValueError
+                except:
+                    raise Usage("Request budget invalid")
+            elif o == '--worker':
+                cfg.worker = True
+            elif o == '--transport':
+                if v not in ['requests', 'direct']:
+                    raise Usage("Unknown transport: {}".format(v))
+                cfg.transport = v
+            elif o == '--mqtt':
+                try:
+                    parse_broker(v)
+                except ValueError as err:
+                    raise Usage(str(err))
+                cfg.mqtt = v
 
         # Remaining arg is octoprint host
         if len(args) == 1:
@@ -176,6 +223,11 @@ def main(argv=None):
             # Custom global logger - set level
             logging.getLogger('OctoPyClient').setLevel(loglevel)
 
+            # GLib-backed asyncio loop must be installed before the UI is created
+            if cfg.aio and not installGLibLoop():
+                logging.getLogger('OctoPyClient').warning("No GLib asyncio loop (PyGObject >= 3.50 or gbulb) - using timer threads")
+                cfg.aio = False
+
             Gtk.init()
             settings = Gtk.Settings.get_default()
             settings.set_property("gtk_application_prefer_dark_theme", True)
@@ -0,0 +1,250 @@
+import asyncio
+from urllib import parse as urlparse
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from .octorest import OctoRest, RequestTimeout
+
+class _Reply:
+    """
+    Response view for the shared OctoRest._check_response
+    """
+
+    def __init__(self, status, body, url):
+        self.status_code = status
+        self.text = body.decode('utf-8', 'replace')
+        self.url = url
+
+class AsyncOctoRest(OctoRest):
+    """
+    asyncio version of OctoRest
+
+    All API methods of OctoRest are available and return awaitables.
+    Requests share one aiohttp session (non-blocking sockets on the
+    running event loop), up to 'limit' of them may be in flight.
+
+    Requests use the (connect, read) timeouts of OctoRest.TIMEOUTS,
+    'timeout' replaces them by a total timeout for every request.
+    deadline() does not apply here, bound a group of calls with
+    plain asyncio instead:
+        await asyncio.wait_for(client.printer(), 2.0)
+    """
+
+    def __init__(self, *, url=None, apikey=None, session=None, timeout=None, limit=100,
+                 decoder=None, compress=False):
+        """
+        Initialize the object with URL and API key
+
+        No request is made until open() is awaited. If a session is
+        provided, it will be used and not closed by close().
+        decoder and compress are the same as for OctoRest.
+        """
+        if aiohttp is None:
+            raise RuntimeError('aiohttp is not installed')
+
+        self._setup(url, apikey, decoder, compress)
+        self.apikey = apikey
+        self.timeout = timeout
+        self.limit = limit
+        self.session = session
+        self._own_session = session is None
+        self.version = None
+
+    async def open(self):
+        """
+        Create the session (if needed) and check the API key
+        """
+        if self.session is None:
+            if self.socket_path is not None:
+                connector = aiohttp.UnixConnector(path=self.socket_path, limit=self.limit)
+            else:
+                connector = aiohttp.TCPConnector(limit=self.limit)
+            self.session = aiohttp.ClientSession(connector=connector)
+        self.version = await self.get_version()
+        return self
+
+    async def close(self):
+        if self._own_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _request(self, method, path, params=None, data=None,
+                       files=None, json=None, headers=None, kind='status'):
+        """
+        Perform one HTTP request with the auth header
+
+        Returns status, headers, body and final URL,
+        raises RequestTimeout if the server did not answer in time.
+        Failed requests are retried as in OctoRest._call
+        """
+        url = urlparse.urljoin(self.url, path)
+        if files:
+            data = self._form(files, data or json)
+            json = None
+        if params:
+            params = {k: str(v) for k, v in params.items()}
+        headers = dict(headers or {})
+        headers['X-Api-Key'] = self.apikey
+        headers['Accept-Encoding'] = self._encodings()
+        if self.timeout is not None:
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+        else:
+            connect, read = self.timeouts[kind]
+            timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+        self.retry_budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                async with self.session.request(method, url, params=params, data=data, json=json,
+                                                headers=headers, timeout=timeout) as response:
+                    body = await response.read()
+                    # Content-Length is the compressed size, if sent
+                    self._count_wire(path, response.content_length or len(body), len(body))
+                    reply = response.status, response.headers, body, str(response.url)
+                if reply[0] not in self.RETRY_STATUS:
+                    if attempt:
+                        self._count('retry_ok')
+                    return reply
+                error = None
+            except asyncio.TimeoutError as err:
+                self._count('timeout')
+                raise RequestTimeout('{} {} timed out'.format(method, url)) from err
+            except aiohttp.ClientSSLError:
+                raise
+            except aiohttp.ClientConnectionError as err:
+                error = err
+            # Same retry policy as OctoRest._call
+            delay = self._retry_delay(method, attempt, files)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return reply
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _form(self, files, fields):
+        form = aiohttp.FormData()
+        for name, value in (fields or {}).items():
+            form.add_field(name, value)
+        for name, (filename, fileobj, mime) in files.items():
+            form.add_field(name, fileobj, filename=filename, content_type=mime)
+        return form
+
+    async def _send(self, method, path, ret=True, **kwargs):
+        if method != 'GET':
+            kwargs['kind'] = 'upload' if kwargs.get('files') else 'command'
+        status, headers, body, url = await self._request(method, path, **kwargs)
+        self._check_response(_Reply(status, body, url))
+        if ret:
+            return self._decode(body)
+
+    async def _get(self, path, params=None, validate=False):
+        """
+        Same as OctoRest._get
+        """
+        if not validate:
+            return await self._send('GET', path, params=params)
+
+        url = urlparse.urljoin(self.url, path)
+        key, cached, headers = self._conditional(url, params)
+        status, rheaders, body, rurl = await self._request('GET', path, params=params, headers=headers)
+        if status == 304 and cached is not None:
+            return cached[2]
+        self._check_response(_Reply(status, body, rurl))
+
+        data = self._decode(body)
+        self._store_validators(key, rheaders, data)
+        return data
+
+    async def _post(self, path, data=None, files=None, json=None, ret=True):
+        return await self._send('POST', path, ret, data=data, files=files, json=json)
+
+    async def _put(self, path, data=None, files=None, json=None, ret=True):
+        return await self._send('PUT', path, ret, data=data, files=files, json=json)
+
+    async def _patch(self, path, data=None, files=None, json=None, ret=True):
+        return await self._send('PATCH', path, ret, data=data, files=files, json=json)
+
+    async def _delete(self, path):
+        await self._send('DELETE', path, ret=False)
+
+    async def _write(self, method, path, invalidate, **kwargs):
+        """
+        Same as OctoRest._write, invalidates once the write was awaited
+        """
+        send = getattr(self, '_' + method.lower())
+        try:
+            return await send(path, **kwargs)
+        finally:
+            self._invalidate(*invalidate)
+
+    def _cached(self, endpoint, fetch, *args):
+        # The TTL cache refreshes on threads - not used on the event loop
+        return fetch(*args)
+
+    def transport_stats(self):
+        return {}
+
+    ################################
+    ### METHODS USING REPLY DATA ###
+    ################################
+
+    async def state(self):
+        """
+        A shortcut to get the current state.
+        """
+        return (await self.connection_info())['current']['state']
+
+    async def status(self):
+        """
+        Same as OctoRest.status
+        """
+        if self.has_status():
+            code, headers, body, url = await self._request('GET', self.STATUS_PATH)
+            if self._status_usable(code):
+                return self._split_status(self._decode(body))
+
+        status = {}
+        error = None
+        for name, call in self._status_calls():
+            if error is not None:
+                status[name] = error
+                continue
+            try:
+                status[name] = await call()
+            except OSError as err:
+                status[name] = error = err
+            except Exception as err:
+                status[name] = err
+        return status
+
+    async def upload(self, file, *, location='local',
+                     select=False, print=False, userdata=None, path=None):
+        """
+        Same as OctoRest.upload, the file is kept open until sent
+        """
+        with self._file_tuple(file) as file_tuple:
+            files = {'file': file_tuple}
+            data = self._upload_fields(select, print, userdata, path)
+
+            return await self._post('/api/files/{}'.format(location),
+                                    files=files, data=data)
+
+    async def upload_language(self, file):
+        """
+        Same as OctoRest.upload_language, the file is kept open until sent
+        """
+        with self._file_tuple(file) as file_tuple:
+            files = {'file': file_tuple}
+
+            return await self._post('/api/languages', files=files)
@@ -0,0 +1,88 @@
+import threading
+import time
+
+class RequestThrottled(RuntimeError):
+    """
+    Background request not sent - request budget exhausted
+    """
+
+class RequestBudget:
+    """
+    Request rate and concurrency limit shared by all callers
+
+    Token bucket of 'rate' requests per second (up to 'burst' saved)
+    and at most 'inflight' background requests at a time. Background
+    requests are refused when over budget, never delayed. Commands
+    are always sent but use up tokens, so polling slows down instead.
+    """
+
+    def __init__(self, rate, inflight=2, burst=None):
+        self.rate = rate
+        self.inflight = inflight
+        self.burst = burst if burst is not None else max(1, rate)
+        self.throttled = 0
+        self._tokens = self.burst
+        self._stamp = time.monotonic()
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def acquire(self):
+        """
+        Take a token and an in-flight slot for a background request
+
+        Returns False (and counts it) when either is not available
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens < 1 or self._active >= self.inflight:
+                self.throttled += 1
+                return False
+            self._tokens -= 1
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+
+    def charge(self):
+        """
+        Take a token for a command, the balance may go negative
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+
+class RetryBudget:
+    """
+    Limit on automatic retries as a share of requests
+
+    Every request deposits 'ratio' tokens (up to 'reserve' saved),
+    every retry takes one. A short burst of failures is retried in
+    full, a lasting outage adds at most 'ratio' extra requests.
+    """
+
+    def __init__(self, ratio=0.2, reserve=10):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._tokens = float(reserve)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.reserve, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """
+        Take a token for a retry, False when none is left
+        """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
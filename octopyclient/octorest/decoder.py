@@ -0,0 +1,113 @@
+"""
+JSON decoder backends for OctoRest replies
+
+Decoders take the raw reply body (bytes) and return the decoded data.
+orjson and ujson parse bytes directly, the stdlib decoder detects the
+UTF encoding itself (no charset guessing as in requests' .json()).
+
+Micro-benchmark on recorded payloads:
+    $ curl -s -H "X-Api-Key: $KEY" "http://octopi/api/files?recursive=true" > files.json
+    $ curl -s -H "X-Api-Key: $KEY" http://octopi/api/settings > settings.json
+    $ python -m octopyclient.octorest.decoder files.json settings.json
+"""
+
+import json
+import sys
+import time
+
+def _stdlib():
+    return json.loads
+
+def _orjson():
+    import orjson
+    return orjson.loads
+
+def _ujson():
+    import ujson
+    # No buffer protocol support
+    return lambda body: ujson.loads(bytes(body))
+
+# Name: loader, in order of preference for 'auto'
+BACKENDS = {
+    'orjson': _orjson,
+    'ujson': _ujson,
+    'json': _stdlib,
+}
+
+def available():
+    """
+    Names of the installed decoder backends
+    """
+    names = []
+    for name, loader in BACKENDS.items():
+        try:
+            loader()
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+def get_decoder(name=None):
+    """
+    Decoder function of backend name ('json', 'orjson', 'ujson')
+
+    None or 'auto' selects the fastest installed backend.
+    Raises ValueError for unknown or not installed backends.
+    """
+    if name in (None, 'auto'):
+        name = available()[0]
+    try:
+        loader = BACKENDS[name]
+    except KeyError:
+        raise ValueError('Unknown JSON decoder: {}'.format(name))
+    try:
+        return loader()
+    except ImportError:
+        raise ValueError('JSON decoder not installed: {}'.format(name))
+
+def benchmark(payloads, rounds=None, min_time=0.5):
+    """
+    Mean decode time (sec) per backend and payload
+
+    payloads: {name: bytes}. Returns {backend: {payload: seconds}}
+    """
+    results = {}
+    for backend in available():
+        decode = get_decoder(backend)
+        results[backend] = {}
+        for name, body in payloads.items():
+            decode(body)
+            n = rounds or 1
+            while True:
+                start = time.perf_counter()
+                for _ in range(n):
+                    decode(body)
+                elapsed = time.perf_counter() - start
+                if rounds or elapsed >= min_time:
+                    break
+                n *= 2
+            results[backend][name] = elapsed / n
+    return results
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return 2
+
+    payloads = {}
+    for path in argv:
+        with open(path, 'rb') as f:
+            payloads[path] = f.read()
+
+    results = benchmark(payloads)
+    baseline = results['json']
+    print('{:40s} {:>8s} {:>10s} {:>8s}'.format('payload', 'backend', 'usec', 'speedup'))
+    for name, body in payloads.items():
+        label = '{} ({:d}KB)'.format(name, len(body) // 1024)
+        for backend, times in results.items():
+            print('{:40s} {:>8s} {:10.1f} {:7.2f}x'.format(label, backend, times[name] * 1e6,
+                                                          baseline[name] / times[name]))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,144 @@
+import json as jsonlib
+import ssl
+from urllib.parse import urlencode
+
+from urllib3 import PoolManager, Timeout
+from urllib3.exceptions import (HTTPError, MaxRetryError, NewConnectionError,
+                                SSLError, TimeoutError as Urllib3Timeout)
+from urllib3.filepost import encode_multipart_formdata
+
+from .octorest import Transport
+from .pool import SOCKET_OPTIONS, default_resolver, pool_classes, pool_stats, stale_retry, tls_context
+
+def _builtin(err):
+    """
+    Builtin exception for a urllib3 one
+
+    Connection errors keep the urllib3 error as first argument, like
+    requests does (see: utils.isRemoteDisconnect)
+    """
+    reason = err.reason if isinstance(err, MaxRetryError) and err.reason is not None else err
+    if isinstance(reason, SSLError):
+        return ssl.SSLError(str(reason))
+    if isinstance(reason, Urllib3Timeout) and not isinstance(reason, NewConnectionError):
+        return TimeoutError(str(reason))
+    return ConnectionError(reason)
+
+class _Reply:
+    """
+    requests.Response view of a urllib3 reply
+    """
+
+    def __init__(self, response, url, preloaded):
+        self.raw = response
+        self.status_code = response.status
+        self.headers = response.headers
+        self.url = url
+        # Body already read by urlopen (not streamed)
+        self.preloaded = preloaded
+
+    @property
+    def text(self):
+        try:
+            return self.raw.data.decode('utf-8', 'replace')
+        finally:
+            self.raw.release_conn()
+
+    def iter_content(self, size):
+        if self.preloaded:
+            # stream() yields nothing once the body was read
+            if self.raw.data:
+                yield self.raw.data
+            return
+        try:
+            yield from self.raw.stream(size, decode_content=True)
+        except (HTTPError, OSError) as err:
+            raise _builtin(err) from err
+        finally:
+            self.raw.release_conn()
+
+    def close(self):
+        self.raw.drain_conn()
+        self.raw.release_conn()
+
+class DirectTransport(Transport):
+    """
+    OctoRest transport straight on a urllib3 connection pool
+
+    No requests: URL and headers are built once by setup(), request
+    paths are appended as they are. The pool is the same as that of
+    transport.PooledAdapter (pool_size connections, idle reaping, host
+    name cache, TLS session resumption, Unix sockets). verify is True
+    (system CA certificates), a CA bundle path or False (no checks).
+
+    Errors are raised as builtin TimeoutError, ssl.SSLError and
+    ConnectionError.
+    """
+
+    def __init__(self, pool_size=4, idle_timeout=15, resolver=None, verify=True):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self.resolver = resolver or default_resolver
+        self.verify = verify
+        self.tls = tls_context()
+        self.pool = None
+
+    def setup(self, url, headers, socket_path=None):
+        super().setup(url, headers, socket_path)
+        tls = {}
+        if url.startswith('https:'):
+            tls = {'ssl_context': self.tls, 'cert_reqs': 'CERT_REQUIRED' if self.verify else 'CERT_NONE'}
+            if isinstance(self.verify, str):
+                tls['ca_certs'] = self.verify
+        manager = PoolManager(num_pools=1, maxsize=self.pool_size, block=True,
+                              socket_options=SOCKET_OPTIONS, retries=stale_retry(), **tls)
+        manager.pool_classes_by_scheme = pool_classes(self.idle_timeout, self.resolver, socket_path)
+        self.pool = manager.connection_from_url(url)
+        # Pre-built header sets by body type
+        self.headers['User-Agent'] = 'octopyclient'
+        self._json_headers = dict(self.headers, **{'Content-Type': 'application/json'})
+        self._form_headers = dict(self.headers, **{'Content-Type': 'application/x-www-form-urlencoded'})
+
+    def request(self, method, path, *, params=None, headers=None, data=None,
+                json=None, files=None, timeout=None, stream=False):
+        if params:
+            path += '?' + urlencode(params, doseq=True)
+
+        body = None
+        base = self.headers
+        if files:
+            # Form fields are data or, as sent by OctoRest.upload, json
+            fields = dict(data or json or {})
+            for name, value in files.items():
+                if isinstance(value, tuple) and hasattr(value[1], 'read'):
+                    value = (value[0], value[1].read()) + value[2:]
+                fields[name] = value
+            body, content_type = encode_multipart_formdata(fields)
+            base = dict(self.headers, **{'Content-Type': content_type})
+        elif json is not None:
+            body = jsonlib.dumps(json).encode('utf-8')
+            base = self._json_headers
+        elif isinstance(data, dict):
+            body = urlencode(data, doseq=True)
+            base = self._form_headers
+        elif data is not None:
+            body = data
+        if headers:
+            base = dict(base, **headers)
+
+        if timeout is not None:
+            timeout = Timeout(connect=timeout[0], read=timeout[1])
+        try:
+            response = self.pool.urlopen(method, path, body=body, headers=base, timeout=timeout,
+                                         preload_content=not stream, decode_content=True,
+                                         release_conn=not stream)
+        except (HTTPError, OSError) as err:
+            raise _builtin(err) from err
+        return _Reply(response, self.url + path, not stream)
+
+    def stats(self):
+        return pool_stats([self.pool], self.tls) if self.pool is not None else {}
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
@@ -0,0 +1,155 @@
+"""
+In-memory OctoRest transport
+
+Client time per status poll (printer, job and connection state) with
+each transport, replies recorded from a server for the memory one:
+    $ python -m octopyclient.octorest.memory http://octopi APIKEY [POLLS]
+The URL may be unix:///path/to/socket, run both to compare a local
+proxy socket with loopback TCP.
+Process CPU time per poll is the client overhead, the memory
+transport shows the part spent in OctoRest itself.
+"""
+
+import json as jsonlib
+import sys
+import threading
+import time
+from collections import deque
+
+from .octorest import OctoRest, Transport
+
+class _Reply:
+    """
+    requests.Response view of a canned reply
+    """
+
+    def __init__(self, status, body, url, headers):
+        self.status_code = status
+        self.headers = headers
+        self.url = url
+        self._body = body
+
+    @property
+    def text(self):
+        return self._body.decode('utf-8', 'replace')
+
+    def iter_content(self, size):
+        for start in range(0, len(self._body), size):
+            yield self._body[start:start + size]
+
+    def close(self):
+        pass
+
+class MemoryTransport(Transport):
+    """
+    OctoRest transport answering from a table instead of a server
+
+    For tests, and to measure the time OctoRest itself spends per call.
+    routes maps 'path' or ('METHOD', 'path') to a reply: decoded data
+    (sent as JSON, 200 OK), a (status, data) tuple, bytes, or an
+    exception to raise. A callable is called with (method, path,
+    params, body) and returns one of these. The query is not part of
+    the path. Unknown paths answer 404. The last 'keep' requests are
+    recorded in 'sent' as (method, path, params, body).
+    """
+
+    JSON = {'Content-Type': 'application/json'}
+
+    def __init__(self, routes=None, keep=100):
+        self.routes = {}
+        self.sent = deque(maxlen=keep)
+        self.requests = 0
+        self._lock = threading.Lock()
+        for key, reply in (routes or {}).items():
+            self.route(key, reply)
+
+    def route(self, key, reply):
+        """
+        Set the reply of 'path' or ('METHOD', 'path'), data is encoded now
+        """
+        self.routes[key] = reply if callable(reply) else self._encode(reply)
+
+    def _encode(self, reply):
+        if isinstance(reply, Exception):
+            return reply
+        status, data = reply if isinstance(reply, tuple) else (200, reply)
+        if data is None:
+            body = b''
+        elif isinstance(data, bytes):
+            body = data
+        else:
+            body = jsonlib.dumps(data).encode('utf-8')
+        return status, body
+
+    def request(self, method, path, *, params=None, headers=None, data=None,
+                json=None, files=None, timeout=None, stream=False):
+        body = json if json is not None else data
+        with self._lock:
+            self.sent.append((method, path, params, body))
+            self.requests += 1
+
+        reply = self.routes.get((method, path), self.routes.get(path))
+        if reply is None:
+            reply = (404, b'Not found')
+        elif callable(reply):
+            reply = self._encode(reply(method, path, params, body))
+        if isinstance(reply, Exception):
+            raise reply
+        status, body = reply
+        return _Reply(status, body, self.url + path, self.JSON)
+
+# Endpoints of one status poll
+POLL = ('/api/printer', '/api/job', '/api/connection')
+
+def _poll(client):
+    client.printer(exclude=['sd'])
+    client.job_info()
+    client.state()
+
+def benchmark(clients, polls=200):
+    """
+    Mean wall and process CPU time (sec) per poll: {name: (wall, cpu)}
+    """
+    results = {}
+    for name, client in clients.items():
+        _poll(client)
+        wall, cpu = time.perf_counter(), time.process_time()
+        for _ in range(polls):
+            _poll(client)
+        results[name] = ((time.perf_counter() - wall) / polls,
+                         (time.process_time() - cpu) / polls)
+    return results
+
+def main(argv):
+    if len(argv) < 2:
+        print(__doc__)
+        return 2
+    from .direct import DirectTransport
+    from .transport import pooled_session
+    url, apikey = argv[:2]
+    polls = int(argv[2]) if len(argv) > 2 else 200
+
+    clients = {'requests': OctoRest(url=url, apikey=apikey, session=pooled_session()),
+               'direct': OctoRest(url=url, apikey=apikey, transport=DirectTransport())}
+    # Record the replies of one poll and of a command with a reply body
+    recorder = clients['requests']
+    routes = {'/api/version': recorder.get_version(),
+              ('POST', '/api/login'): recorder.login(passive=True)}
+    for path in POLL:
+        routes[path] = recorder._get(path)
+    clients['memory'] = OctoRest(url=url, apikey=apikey, transport=MemoryTransport(routes))
+
+    # Non-streamed replies (POST) must decode the same with every transport
+    for name, client in clients.items():
+        if client.login(passive=True) != routes[('POST', '/api/login')]:
+            print('{}: POST /api/login reply differs'.format(name))
+            return 1
+
+    results = benchmark(clients, polls)
+    print('{:10s} {:>12s} {:>12s}'.format('transport', 'wall ms/poll', 'cpu ms/poll'))
+    for name, (wall, cpu) in results.items():
+        print('{:10s} {:12.3f} {:12.3f}'.format(name, 1000 * wall, 1000 * cpu))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
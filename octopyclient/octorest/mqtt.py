@@ -0,0 +1,309 @@
+"""
+Printer, job and connection state from the OctoPrint-MQTT plugin
+
+Time from a message published on the broker to its data in the
+snapshot (OctoPrint replies come from a MemoryTransport):
+    $ python -m octopyclient.octorest.mqtt BROKER [MESSAGES]
+"""
+
+import json
+import logging
+import sys
+import threading
+import time
+from urllib import parse as urlparse
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+from .push import StateSnapshot, state_flags, _NOT_CONNECTED
+
+log = logging.getLogger('OctoPyClient')
+
+def parse_broker(broker):
+    """
+    (host, port, username, password) of [mqtt://][user[:password]@]host[:port]
+    """
+    if '://' not in broker:
+        broker = 'mqtt://' + broker
+    parsed = urlparse.urlsplit(broker)
+    if not parsed.hostname:
+        raise ValueError('Provided MQTT broker is empty')
+    return parsed.hostname, parsed.port or 1883, parsed.username, parsed.password
+
+class OctoMqtt(StateSnapshot):
+    """
+    Live printer, job and connection state from the OctoPrint-MQTT plugin
+
+    Starts from the REST state, then follows the plugin's temperature,
+    progress and event topics so status is not polled. Without the
+    plugin's printer data in progress messages, print time is counted
+    from the PrintStarted event and time left is estimated from the
+    progress. Commands still go through OctoRest.
+    """
+
+    def __init__(self, client, broker, *, base='octoPrint/', retry=5, listener=None):
+        """
+        Initialize with a connected OctoRest client and the broker address
+        [user[:password]@]host[:port] (default port 1883)
+
+        base is the plugin's base topic. retry is the longest delay in
+        seconds between reconnects. listener(slices) is called from the
+        MQTT thread with the snapshot slices a message changed
+        ('connection', 'printer', 'job').
+        """
+        if mqtt is None:
+            raise RuntimeError('paho-mqtt is not installed')
+        super().__init__()
+
+        self.client = client
+        self.host, self.port, username, password = parse_broker(broker)
+        self.base = base if base.endswith('/') else base + '/'
+        self.retry = retry
+        self.listener = listener
+
+        self._connected = False
+        # Plugin online (its last will topic)
+        self._plugin = True
+        self._seeded = False
+        self._seed_at = 0.0
+        # Wall clock start of the print, if printing
+        self._started = None
+
+        try:
+            self._mqtt = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        except AttributeError:
+            # paho-mqtt < 2.0
+            self._mqtt = mqtt.Client()
+        if username:
+            self._mqtt.username_pw_set(username, password)
+        self._mqtt.reconnect_delay_set(1, retry)
+        self._mqtt.on_connect = self._on_connect
+        self._mqtt.on_disconnect = self._on_disconnect
+        self._mqtt.on_message = self._on_message
+
+    def start(self):
+        """
+        Connect to the broker in the background
+        """
+        self._mqtt.connect_async(self.host, self.port, keepalive=30)
+        self._mqtt.loop_start()
+
+    def stop(self):
+        """
+        Disconnect and stop the MQTT thread
+        """
+        self._live = False
+        self._mqtt.disconnect()
+        self._mqtt.loop_stop()
+
+    #####################
+    ### MQTT HANDLING ###
+    #####################
+
+    def _set_live(self):
+        self._live = self._connected and self._seeded and self._plugin
+
+    def _on_connect(self, mqttc, userdata, flags, rc, *args):
+        if rc != 0:
+            log.info("MQTT connection refused: {}".format(str(rc)))
+            return
+        log.info("MQTT connected to {}:{}".format(self.host, self.port))
+        topics = ('temperature/+', 'progress/printing', 'event/+', 'mqtt')
+        mqttc.subscribe([(self.base + topic, 0) for topic in topics])
+        self._connected = True
+        self._seed()
+
+    def _on_disconnect(self, mqttc, userdata, *args):
+        self._connected = False
+        self._set_live()
+        log.info("MQTT disconnected")
+
+    def _on_message(self, mqttc, userdata, msg):
+        topic = msg.topic[len(self.base):]
+        if topic == 'mqtt':
+            self._plugin = msg.payload != b'disconnected'
+            self._set_live()
+            return
+        if not self._seeded:
+            self._seed()
+
+        try:
+            data = json.loads(msg.payload)
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+
+        kind, _, name = topic.partition('/')
+        if kind == 'temperature':
+            slices = self._temperature(name, data)
+        elif kind == 'progress':
+            slices = self._progress_update(data)
+        elif kind == 'event':
+            slices = self._event(name, data)
+        else:
+            return
+        if slices and self._live and self.listener is not None:
+            self.listener(slices)
+
+    def _seed(self):
+        # Messages only tell what changed - start from the REST state,
+        # at most every 'retry' seconds while OctoPrint does not answer
+        if time.monotonic() < self._seed_at:
+            return
+        try:
+            text = self.client.state()
+            printer = None
+            if text not in _NOT_CONNECTED:
+                printer = self.client.printer(exclude=['sd'])
+            job = self.client.job_info()
+        except Exception as err:
+            log.debug("MQTT initial state: {}".format(str(err)))
+            self._seed_at = time.monotonic() + self.retry
+            return
+
+        with self._lock:
+            if printer is not None:
+                self._state = printer['state']
+                temperature = printer.get('temperature') or {}
+                self._temps = {k: {'actual': v.get('actual'), 'target': v.get('target')}
+                               for k, v in temperature.items()}
+                self._offsets = {k: v.get('offset', 0) for k, v in temperature.items()}
+            else:
+                self._state = {'text': text, 'flags': state_flags(text)}
+            self._job = job['job']
+            self._progress = job['progress']
+            print_time = (self._progress or {}).get('printTime')
+            printing = self._state['flags'].get('printing') or self._state['flags'].get('paused')
+            self._started = time.time() - print_time if printing and print_time is not None else None
+        self._seeded = True
+        self._set_live()
+
+    def _temperature(self, heater, data):
+        with self._lock:
+            self._temps[heater] = {'actual': data.get('actual'), 'target': data.get('target')}
+        return ('printer',)
+
+    def _progress_update(self, data):
+        if data.get('printer_data'):
+            # Full printer data, if enabled in the plugin
+            self._update(data['printer_data'])
+            return ('connection', 'printer', 'job')
+
+        completion = data.get('progress')
+        with self._lock:
+            progress = dict(self._progress or {}, completion=completion)
+            if self._started is not None:
+                elapsed = time.time() - self._started
+                progress['printTime'] = int(elapsed)
+                if completion:
+                    progress['printTimeLeft'] = int(elapsed * (100 - completion) / completion)
+                    progress['printTimeLeftOrigin'] = 'linear'
+            self._progress = progress
+        return ('job',)
+
+    def _event(self, name, data):
+        if name in ('PrinterStateChanged', 'Disconnected'):
+            text = data.get('state_string') if name == 'PrinterStateChanged' else 'Offline'
+            if not text:
+                return ()
+            with self._lock:
+                self._state = {'text': text, 'flags': state_flags(text)}
+                if text in _NOT_CONNECTED:
+                    self._temps = {}
+            return ('connection', 'printer')
+
+        if name == 'PrintStarted':
+            with self._lock:
+                self._job = {'file': {'name': data.get('name'), 'path': data.get('path'),
+                                      'origin': data.get('origin'), 'size': data.get('size')},
+                             'estimatedPrintTime': None, 'lastPrintTime': None,
+                             'filament': None, 'user': data.get('owner')}
+                self._progress = {'completion': 0.0, 'filepos': 0, 'printTime': 0,
+                                  'printTimeLeft': None, 'printTimeLeftOrigin': None}
+                self._started = time.time()
+            return ('job',)
+
+        if name == 'PrintDone':
+            with self._lock:
+                if self._job is not None:
+                    self._job = dict(self._job, lastPrintTime=data.get('time'))
+                self._progress = dict(self._progress or {}, completion=100.0, printTimeLeft=0)
+                self._started = None
+            return ('job',)
+
+        if name in ('PrintFailed', 'PrintCancelled'):
+            with self._lock:
+                self._started = None
+            return ('job',)
+        return ()
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return 2
+    from .memory import MemoryTransport
+    from .octorest import OctoRest
+    broker = argv[0]
+    count = int(argv[1]) if len(argv) > 1 else 200
+
+    temperature = {'tool0': {'actual': 210.0, 'target': 210.0, 'offset': 0},
+                   'bed': {'actual': 60.0, 'target': 60.0, 'offset': 0}}
+    routes = {
+        '/api/version': {'api': '0.1', 'server': '1.9.3'},
+        '/api/connection': {'current': {'state': 'Printing'}},
+        '/api/printer': {'state': {'text': 'Printing', 'flags': state_flags('Printing')},
+                         'temperature': temperature},
+        '/api/job': {'job': {'file': {'name': 'benchy.gcode'}, 'lastPrintTime': None},
+                     'progress': {'completion': 10.0, 'printTime': 60, 'printTimeLeft': 540},
+                     'state': 'Printing'},
+    }
+    client = OctoRest(url='http://octoprint', apikey='benchmark', transport=MemoryTransport(routes))
+
+    changed = threading.Event()
+    source = OctoMqtt(client, broker, listener=lambda slices: changed.set())
+    source.start()
+    host, port, username, password = parse_broker(broker)
+    try:
+        publisher = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+    except AttributeError:
+        publisher = mqtt.Client()
+    if username:
+        publisher.username_pw_set(username, password)
+    publisher.connect(host, port)
+    publisher.loop_start()
+    for _ in range(50):
+        if source.is_live:
+            break
+        time.sleep(0.1)
+    else:
+        print('No state from {}'.format(broker))
+        return 1
+
+    latencies = []
+    for n in range(count):
+        changed.clear()
+        target = float(n)
+        start = time.perf_counter()
+        publisher.publish(source.base + 'temperature/tool0', json.dumps({'actual': 200.0, 'target': target}))
+        while changed.wait(2):
+            changed.clear()
+            if source.tool()['tool0']['target'] == target:
+                latencies.append(time.perf_counter() - start)
+                break
+        else:
+            print('Message {} lost'.format(n))
+    publisher.loop_stop()
+    source.stop()
+
+    latencies.sort()
+    if latencies:
+        print('{} messages: p50 {:.2f}ms  p90 {:.2f}ms  p99 {:.2f}ms  max {:.2f}ms'.format(
+            len(latencies), *(1000 * latencies[int(q * (len(latencies) - 1))] for q in (0.5, 0.9, 0.99, 1))))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
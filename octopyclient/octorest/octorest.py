@@ -1,19 +1,246 @@
 import os
+import random
+import ssl
+import time
+import threading
+from collections import Counter
 from contextlib import contextmanager
 from urllib import parse as urlparse
 
-import requests
+from .budget import RequestThrottled, RetryBudget
+from .decoder import get_decoder
+
+class RequestTimeout(TimeoutError):
+    """
+    OctoPrint did not answer within the request timeout or deadline
+    """
+
+# Per-thread deadline (monotonic time) set by deadline()
+_deadline = threading.local()
+
+@contextmanager
+def deadline(seconds):
+    """
+    Bound the total time of the OctoRest calls made by this thread
+
+    Each request's timeouts are cut to the time remaining, once it
+    has expired calls raise RequestTimeout without being sent.
+    Nested deadlines can only shorten the outer one.
+    """
+    outer = getattr(_deadline, 'expires', None)
+    expires = time.monotonic() + seconds
+    if outer is not None:
+        expires = min(expires, outer)
+    _deadline.expires = expires
+    try:
+        yield
+    finally:
+        _deadline.expires = outer
+
+# Per-thread background flag set by background()
+_background = threading.local()
+
+@contextmanager
+def background():
+    """
+    Mark the OctoRest calls made by this thread as background polling
+
+    Such calls are subject to the client's request budget: when it is
+    exhausted they raise RequestThrottled without being sent.
+    """
+    outer = getattr(_background, 'on', False)
+    _background.on = True
+    try:
+        yield
+    finally:
+        _background.on = outer
+
+# Per-thread critical flag set by critical()
+_critical = threading.local()
+
+@contextmanager
+def critical():
+    """
+    Send the OctoRest calls made by this thread over the client's
+    reserved transport (see: OctoRest.reserve), if it has one
+
+    Such calls never wait for a connection of the shared pool.
+    """
+    outer = getattr(_critical, 'on', False)
+    _critical.on = True
+    try:
+        yield
+    finally:
+        _critical.on = outer
+
+class Transport:
+    """
+    How OctoRest sends its requests
+
+    request() sends one request and returns a reply with the parts of
+    requests.Response OctoRest reads: status_code, headers, url, text,
+    iter_content(size) and close(). raw.tell() (bytes read on the
+    wire) is optional. classify() names the transport's exceptions.
+    Implementations: transport.RequestsTransport (default),
+    direct.DirectTransport (urllib3 only), memory.MemoryTransport.
+    """
+
+    def setup(self, url, headers, socket_path=None):
+        """
+        Base URL (scheme://host:port) and headers sent with every request
+
+        With socket_path, connections go to that Unix socket instead of
+        the URL's host (see: pool.pool_classes)
+        """
+        self.url = url
+        self.headers = dict(headers)
+        self.socket_path = socket_path
+
+    def request(self, method, path, *, params=None, headers=None, data=None,
+                json=None, files=None, timeout=None, stream=False):
+        """
+        Send method to the base URL + path
+
+        headers are added to the setup headers. timeout is a (connect,
+        read) tuple. stream leaves the body to be read by iter_content
+        """
+        raise NotImplementedError
+
+    def classify(self, err):
+        """
+        'timeout', 'tls' or 'connection' for errors of these kinds
+        raised by request() or while reading a reply, None otherwise
+        """
+        if isinstance(err, TimeoutError):
+            return 'timeout'
+        if isinstance(err, ssl.SSLError):
+            return 'tls'
+        if isinstance(err, ConnectionError):
+            return 'connection'
+        return None
+
+    def stats(self):
+        """
+        Connection counters, if kept (see: pool.pool_stats)
+        """
+        return {}
+
+    def close(self):
+        pass
+
+def make_transport(name=None, pool_size=4):
+    """
+    Pooled transport by name: 'requests' (default) or 'direct'
+    """
+    if name in (None, 'requests'):
+        from .transport import RequestsTransport, pooled_session
+        return RequestsTransport(pooled_session(pool_size=pool_size))
+    if name == 'direct':
+        from .direct import DirectTransport
+        return DirectTransport(pool_size=pool_size)
+    raise ValueError('Unknown transport: {}'.format(name))
+
+class _Flight:
+    """
+    One GET in flight, shared by identical concurrent callers
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # The leader's error is not the followers' (over its request
+        # budget or past its deadline) - they send the request
+        # themselves (see: OctoRest._get)
+        self.own = False
+
+    def wait(self):
+        # Followers are bound by their own deadline, not the leader's
+        expires = getattr(_deadline, 'expires', None)
+        timeout = None if expires is None else max(0, expires - time.monotonic())
+        if not self.done.wait(timeout):
+            raise RequestTimeout('Deadline expired')
+        if self.error is not None:
+            raise self.error
+        return self.result
 
 class OctoRest:
     """
     Encapsulates communication with one OctoPrint instance
     """
 
-    def __init__(self, *, url=None, apikey=None, session=None):
+    # Seconds cached replies of slow-changing endpoints stay fresh.
+    # Stale replies are returned immediately and refreshed in the
+    # background. Endpoints not listed are not cached.
+    CACHE_TTL = {
+        'settings': 60,
+        'custom_controls': 300,
+        'system_commands': 300,
+        'printer_profile': 300,
+    }
+
+    # (connect, read) timeouts in seconds per endpoint class.
+    # 'status' - GETs, 'command' - other methods, 'upload' - file uploads
+    TIMEOUTS = {
+        'status': (3.05, 5),
+        'command': (3.05, 15),
+        'upload': (3.05, 120),
+    }
+
+    # Automatic retries of failed requests (see: _retry_delay).
+    # Only methods OctoPrint handles the same when sent twice are
+    # retried - POST commands (gcode, jog, extrude, job ...) and
+    # PATCH never are. Timeouts and TLS errors are not retried either.
+    RETRY_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+    # Replies of a proxy in front of a (re)starting OctoPrint
+    RETRY_STATUS = frozenset([502, 503, 504])
+    RETRIES = 2
+    # Base delay (sec), doubled per retry and jittered
+    RETRY_BACKOFF = 0.05
+
+    # Read size of streamed reply bodies
+    CHUNK_SIZE = 64 * 1024
+
+    # Aggregated status endpoint of the OctoPyClient status plugin
+    # (see: status) and the seconds before looking for it again
+    # after it was not found
+    STATUS_PATH = '/api/plugin/octopyclient_status'
+    STATUS_RECHECK = 300
+
+    def __init__(self, *, url=None, apikey=None, session=None, decoder=None,
+                 compress=False, transport=None):
         """
         Initialize the object with URL and API key
 
         If a session is provided, it will be used (mostly for testing)
+        decoder selects the JSON backend ('json', 'orjson', 'ujson'),
+        default is the fastest one installed
+        compress requests gzip/deflate compressed replies
+        transport replaces the requests session (see: Transport)
+        url may be unix:///path/to/socket (see: _setup)
+        """
+        self._setup(url, apikey, decoder, compress)
+
+        if transport is None:
+            # requests is only imported when used
+            from .transport import RequestsTransport
+            transport = RequestsTransport(session)
+        self.transport = transport
+        self.transport.setup(self.url, {'X-Api-Key': apikey,
+                                        'Accept-Encoding': self._encodings()},
+                             self.socket_path)
+        # Transport of the calls made under critical() (see: reserve)
+        self.reserved = None
+
+        # Try a simple request to see if the API key works
+        # Keep the info, in case we need it later
+        self.version = self.get_version()
+
+    def _setup(self, url, apikey, decoder=None, compress=False):
+        """
+        Validate URL and API key, initialize client state
+
+        Shared with AsyncOctoRest
         """
         if not url:
             raise TypeError('Required argument \'url\' not found or emtpy')
@@ -21,36 +248,335 @@ class OctoRest:
             raise TypeError('Required argument \'apikey\' not found or emtpy')
 
         parsed = urlparse.urlparse(url)
-        if parsed.scheme not in ['http', 'https']:
-            raise TypeError('Provided URL is not HTTP(S)')
+        # unix:///path/to/socket - co-located OctoPrint behind a local
+        # proxy listening on a Unix socket, requests go to http://localhost
+        self.socket_path = None
+        if parsed.scheme == 'unix':
+            if not parsed.path:
+                raise TypeError('Provided socket path is empty')
+            self.socket_path = parsed.path
+            parsed = urlparse.urlparse('http://localhost')
+        elif parsed.scheme not in ['http', 'https']:
+            raise TypeError('Provided URL is not HTTP(S) or unix')
         if not parsed.netloc:
             raise TypeError('Provided URL is empty')
 
         self.url = '{}://{}'.format(parsed.scheme, parsed.netloc)
 
-        self.session = session or requests.Session()
-        self.session.headers.update({'X-Api-Key': apikey})
-
-        # Try a simple request to see if the API key works
-        # Keep the info, in case we need it later
-        self.version = self.get_version()
-
-    def _get(self, path, params=None):
+        # Reply bodies are decoded from bytes (see: decoder)
+        self._decode = get_decoder(decoder)
+        self.compress = compress
+        # Bytes per endpoint: {endpoint: [replies, on wire, decoded]}
+        self._wire = {}
+
+        # Optional RequestBudget (see: background)
+        self.budget = None
+        self.retry_budget = RetryBudget()
+
+        # GETs in flight: {(path, params, validate): _Flight}
+        self._flights = {}
+        self._flock = threading.Lock()
+
+        # Validators (ETag / Last-Modified) and decoded data of
+        # conditional GETs, keyed by URL and query parameters
+        self._validators = {}
+        self._vlock = threading.Lock()
+
+        self.timeouts = dict(self.TIMEOUTS)
+
+        # TTL cache: {(endpoint, args): (expires, data)}
+        self.cache_ttl = dict(self.CACHE_TTL)
+        self._cache = {}
+        self._cache_gen = Counter()
+        self._refreshing = set()
+        self._clock = threading.Lock()
+
+        # Event counters for monitoring (see: stats)
+        self.counters = Counter()
+        self._count_lock = threading.Lock()
+
+        # Status plugin: None until asked, then found or not (see: status)
+        self._status_plugin = None
+        self._status_check = 0.0
+
+    def reserve(self, transport):
+        """
+        Send the calls made under critical() over transport
+
+        A pool of their own (one connection is enough) that cache
+        refreshes, push logins and other threads sharing the client's
+        transport cannot hold.
+        """
+        transport.setup(self.url, self.transport.headers, self.socket_path)
+        self.reserved = transport
+
+    def _timeout(self, kind):
+        """
+        (connect, read) timeouts of endpoint class kind, cut to the
+        deadline of the calling thread
+
+        Raises RequestTimeout when the deadline has expired
+        """
+        connect, read = self.timeouts[kind]
+        expires = getattr(_deadline, 'expires', None)
+        if expires is None:
+            return connect, read
+
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            self._count('deadline_expired')
+            raise RequestTimeout('Deadline expired')
+        return min(connect, remaining), min(read, remaining)
+
+    def _retry_delay(self, method, attempt, files=None):
+        """
+        Delay (sec) before retry number attempt + 1 of a failed
+        request, None if it must not be retried
+
+        Every decision is counted (see: stats): retry, retry_unsafe,
+        retry_exhausted, retry_deadline and retry_budget
+        """
+        if method not in self.RETRY_METHODS or files:
+            # Not idempotent, or a file object that cannot be re-read
+            self._count('retry_unsafe')
+            return None
+        if attempt >= self.RETRIES:
+            self._count('retry_exhausted')
+            return None
+        delay = random.uniform(0.5, 1) * self.RETRY_BACKOFF * 2 ** attempt
+        expires = getattr(_deadline, 'expires', None)
+        if expires is not None and time.monotonic() + delay >= expires:
+            self._count('retry_deadline')
+            return None
+        if not self.retry_budget.withdraw():
+            self._count('retry_budget')
+            return None
+        self._count('retry')
+        return delay
+
+    def _call(self, method, path, kind, **kwargs):
+        """
+        Send one request through the transport with the timeouts of kind
+
+        Raises RequestTimeout if the server did not answer in time and
+        RequestThrottled if a background request is over budget.
+        Connection errors and gateway errors (RETRY_STATUS) are retried
+        as allowed by _retry_delay
+        """
+        budget = self.budget
+        limited = budget is not None and getattr(_background, 'on', False)
+        if limited:
+            if not budget.acquire():
+                self._count('throttled')
+                raise RequestThrottled('{} {} over request budget'.format(method, path))
+        elif budget is not None:
+            budget.charge()
+
+        transport = self.transport
+        if self.reserved is not None and getattr(_critical, 'on', False):
+            transport = self.reserved
+
+        self.retry_budget.deposit()
+        try:
+            attempt = 0
+            while True:
+                error = None
+                try:
+                    response = transport.request(method, path, timeout=self._timeout(kind), **kwargs)
+                    if response.status_code not in self.RETRY_STATUS:
+                        break
+                except RequestTimeout:
+                    raise
+                except Exception as err:
+                    if transport.classify(err) != 'connection':
+                        raise
+                    error = err
+                delay = self._retry_delay(method, attempt, kwargs.get('files'))
+                if delay is None:
+                    if error is not None:
+                        raise error
+                    break
+                if error is None:
+                    response.close()
+                attempt += 1
+                time.sleep(delay)
+                if budget is not None:
+                    budget.charge()
+
+            if attempt and response.status_code not in self.RETRY_STATUS:
+                self._count('retry_ok')
+            # Stale keep-alive sockets re-sent by the pool (see: pool.stale_retry)
+            retries = getattr(getattr(response, 'raw', None), 'retries', None)
+            if retries is not None and retries.history:
+                self._count('stale_retry', len(retries.history))
+            return response
+        except RequestTimeout:
+            raise
+        except Exception as err:
+            if transport.classify(err) != 'timeout':
+                raise
+            self._count('timeout')
+            raise RequestTimeout('{} {} timed out: {}'.format(method, self.url + path, err)) from err
+        finally:
+            # In flight until the reply headers arrived
+            if limited:
+                budget.release()
+
+    def _get(self, path, params=None, validate=False):
         """
         Perform HTTP GET on given path with the auth header
 
         Path shall be the ending part of the URL,
         i.e. it should not be full URL
 
+        If validate is set, the request is made conditional on the
+        ETag / Last-Modified of the previous reply and the previously
+        decoded data is returned on 304 Not Modified. Such data is
+        shared between callers and must not be modified.
+
+        Identical GETs (path, params and validate) made while one is
+        in flight are not sent, they share its result. The returned
+        data must therefore not be modified. If the request in flight
+        was throttled or timed out on its caller's deadline, the others
+        send their own.
+
         Raises a RuntimeError when not 20x OK-ish
 
         Returns JSON decoded data
         """
-        url = urlparse.urljoin(self.url, path)
-        response = self.session.get(url, params=params)
+        try:
+            key = (path, tuple(sorted((params or {}).items())), validate)
+            hash(key)
+        except TypeError:
+            return self._fetch(path, params, validate)
+
+        with self._flock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            self._count('single_flight_saved')
+            try:
+                return flight.wait()
+            except Exception:
+                if not flight.own:
+                    raise
+            # Not our budget or deadline - send it
+            self._count('single_flight_resent')
+            return self._get(path, params, validate)
+
+        try:
+            flight.result = self._fetch(path, params, validate)
+            return flight.result
+        except Exception as err:
+            flight.error = err
+            expires = getattr(_deadline, 'expires', None)
+            if isinstance(err, RequestThrottled):
+                flight.own = True
+            elif isinstance(err, RequestTimeout) and expires is not None:
+                flight.own = time.monotonic() >= expires
+            raise
+        finally:
+            with self._flock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _fetch(self, path, params=None, validate=False):
+        if not validate:
+            response = self._call('GET', path, 'status', params=params, stream=True)
+            self._check_response(response)
+            return self._decode(self._body(response, path))
+
+        key, cached, headers = self._conditional(path, params)
+        response = self._call('GET', path, 'status', params=params, headers=headers, stream=True)
+        if response.status_code == 304 and cached is not None:
+            self._body(response, path)
+            return cached[2]
         self._check_response(response)
 
-        return response.json()
+        data = self._decode(self._body(response, path))
+        self._store_validators(key, response.headers, data)
+        return data
+
+    def _body(self, response, path):
+        """
+        Read the reply body and count its size on the wire and decoded
+
+        Streamed bodies are decompressed chunk by chunk into a single
+        buffer, the compressed body is never held in full
+        """
+        body = bytearray()
+        try:
+            for chunk in response.iter_content(self.CHUNK_SIZE):
+                body += chunk
+        except Exception as err:
+            # Read timeout while streaming, not caught by _call
+            if self.transport.classify(err) == 'timeout':
+                self._count('timeout')
+                raise RequestTimeout('{} timed out: {}'.format(response.url, err)) from err
+            raise
+
+        try:
+            wire = response.raw.tell()
+        except AttributeError:
+            wire = len(body)
+        self._count_wire(path, wire, len(body))
+        return body
+
+    def _encodings(self):
+        return 'gzip, deflate' if self.compress else 'identity'
+
+    def _count_wire(self, path, wire, decoded):
+        # Endpoint: path without query, at most 3 levels (/api/files/local)
+        endpoint = '/'.join(path.split('?')[0].split('/')[:4])
+        with self._count_lock:
+            entry = self._wire.setdefault(endpoint, [0, 0, 0])
+            entry[0] += 1
+            entry[1] += wire
+            entry[2] += decoded
+
+    def wire_stats(self, reset=False):
+        """
+        Reply bytes per endpoint: {endpoint: (replies, on wire, decoded)}
+
+        reset clears the counters after taking the snapshot
+        """
+        with self._count_lock:
+            stats = {k: tuple(v) for k, v in self._wire.items()}
+            if reset:
+                self._wire.clear()
+        return stats
+
+    def _get_validated(self, path):
+        return self._get(path, validate=True)
+
+    def _conditional(self, url, params):
+        """
+        Returns validator cache key, cached entry and request headers
+        of a conditional GET
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        with self._vlock:
+            cached = self._validators.get(key)
+
+        headers = {}
+        if cached is not None:
+            etag, modified, data = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if modified:
+                headers['If-Modified-Since'] = modified
+        return key, cached, headers
+
+    def _store_validators(self, key, headers, data):
+        etag = headers.get('ETag')
+        modified = headers.get('Last-Modified')
+        with self._vlock:
+            if etag or modified:
+                self._validators[key] = (etag, modified, data)
+            else:
+                self._validators.pop(key, None)
 
     def _post(self, path, data=None, files=None, json=None, ret=True):
         """
@@ -63,12 +589,12 @@ class OctoRest:
 
         Returns JSON decoded data
         """
-        url = urlparse.urljoin(self.url, path)
-        response = self.session.post(url, data=data, files=files, json=json)
+        response = self._call('POST', path, 'upload' if files else 'command',
+                              data=data, files=files, json=json)
         self._check_response(response)
 
         if ret:
-            return response.json()
+            return self._decode(self._body(response, path))
 
     def _delete(self, path):
         """
@@ -81,8 +607,7 @@ class OctoRest:
 
         Returns nothing
         """
-        url = urlparse.urljoin(self.url, path)
-        response = self.session.delete(url)
+        response = self._call('DELETE', path, 'command')
         self._check_response(response)
     
     def _put(self, path, data=None, files=None, json=None, ret=True):
@@ -96,12 +621,12 @@ class OctoRest:
 
         Returns JSON decoded data
         """
-        url = urlparse.urljoin(self.url, path)
-        response = self.session.put(url, data=data, files=files, json=json)
+        response = self._call('PUT', path, 'upload' if files else 'command',
+                              data=data, files=files, json=json)
         self._check_response(response)
 
         if ret:
-            return response.json()
+            return self._decode(self._body(response, path))
 
     def _patch(self, path, data=None, files=None, json=None, ret=True):
         """
@@ -114,12 +639,122 @@ class OctoRest:
 
         Returns JSON decoded data
         """
-        url = urlparse.urljoin(self.url, path)
-        response = self.session.patch(url, data=data, files=files, json=json)
+        response = self._call('PATCH', path, 'upload' if files else 'command',
+                              data=data, files=files, json=json)
         self._check_response(response)
 
         if ret:
-            return response.json()
+            return self._decode(self._body(response, path))
+
+    def transport_stats(self):
+        """
+        Connection counters of the transport (if kept)
+        """
+        return self.transport.stats()
+
+    def monitor_stats(self, reset=False):
+        """
+        Counters (stats), transport (transport_stats), reply bytes
+        (wire_stats) and DNS lookups (pool.default_resolver) in one
+        call - one request to the network worker, whose resolver is
+        the one used
+
+        reset clears the reply byte counters
+        """
+        from .pool import default_resolver
+        return {'counters': self.stats(), 'transport': self.transport_stats(),
+                'wire': self.wire_stats(reset), 'dns': default_resolver.stats()}
+
+    def _count(self, name, n=1):
+        with self._count_lock:
+            self.counters[name] += n
+
+    def stats(self):
+        """
+        Snapshot of the event counters
+        """
+        with self._count_lock:
+            return dict(self.counters)
+
+    def _cached(self, endpoint, fetch, *args):
+        """
+        Return fetch(*args) through the TTL cache of endpoint
+
+        A fresh entry is returned as is, a stale one is returned
+        and refreshed in the background. Cached data is shared
+        between callers and must not be modified.
+        """
+        ttl = self.cache_ttl.get(endpoint)
+        if not ttl:
+            return fetch(*args)
+
+        key = (endpoint, args)
+        with self._clock:
+            entry = self._cache.get(key)
+            gen = self._cache_gen[endpoint]
+
+        if entry is None:
+            self._count('cache_miss')
+            data = fetch(*args)
+            self._cache_store(key, gen, ttl, data)
+            return data
+
+        expires, data = entry
+        if time.monotonic() < expires:
+            self._count('cache_hit')
+            return data
+
+        self._count('cache_stale')
+        with self._clock:
+            refresh = key not in self._refreshing
+            self._refreshing.add(key)
+        if refresh:
+            threading.Thread(target=self._cache_refresh, args=(key, gen, ttl, fetch),
+                             name='octorest_refresh', daemon=True).start()
+        return data
+
+    def _cache_refresh(self, key, gen, ttl, fetch):
+        try:
+            self._count('cache_refresh')
+            self._cache_store(key, gen, ttl, fetch(*key[1]))
+        except Exception:
+            # Keep serving the stale entry, retry on next access
+            self._count('cache_refresh_error')
+        finally:
+            with self._clock:
+                self._refreshing.discard(key)
+
+    def _cache_store(self, key, gen, ttl, data):
+        with self._clock:
+            # Drop replies fetched before an invalidation
+            if self._cache_gen[key[0]] == gen:
+                self._cache[key] = (time.monotonic() + ttl, data)
+
+    def _invalidate(self, *endpoints):
+        """
+        Drop cached replies of endpoints
+
+        Called once a write completed, so a read racing the write
+        cannot leave the old reply in the cache
+        """
+        with self._clock:
+            for endpoint in endpoints:
+                self._cache_gen[endpoint] += 1
+            for key in [k for k in self._cache if k[0] in endpoints]:
+                del self._cache[key]
+        self._count('cache_invalidate', len(endpoints))
+
+    def _write(self, method, path, invalidate, **kwargs):
+        """
+        Send a POST, PATCH or DELETE, then drop the cached replies of
+        the endpoints in invalidate - also when it failed, the change
+        may have been made
+        """
+        send = getattr(self, '_' + method.lower())
+        try:
+            return send(path, **kwargs)
+        finally:
+            self._invalidate(*invalidate)
 
     def _check_response(self, response):
         """
@@ -178,6 +813,29 @@ class OctoRest:
         """
         return self._post('/apps/auth')
     
+    #############
+    ### LOGIN ###
+    #############
+
+    def login(self, passive=True):
+        """Login
+        http://docs.octoprint.org/en/master/api/general.html#login
+
+        With passive set, the API key is used to identify the user and
+        no new session is created. Returns the user record including the
+        'name' and 'session' needed to authenticate the push socket.
+        """
+        data = {'passive': passive}
+        return self._post('/api/login', json=data)
+
+    def push_url(self):
+        """
+        URL of the raw websocket transport of OctoPrint's SockJS push API
+        """
+        parsed = urlparse.urlparse(self.url)
+        scheme = 'wss' if parsed.scheme == 'https' else 'ws'
+        return '{}://{}/sockjs/websocket'.format(scheme, parsed.netloc)
+
     ###########################
     ### CONNECTION HANDLING ###
     ###########################
@@ -235,7 +893,7 @@ class OctoRest:
             data['save'] = save
         if autoconnect is not None:
             data['autoconnect'] = autoconnect
-        self._post('/api/connection', json=data, ret=False)
+        return self._post('/api/connection', json=data, ret=False)
 
     def disconnect(self):
         """Issue a connection command
@@ -244,7 +902,7 @@ class OctoRest:
         Instructs OctoPrint to disconnect from the printer
         """
         data = {'command': 'disconnect'}
-        self._post('/api/connection', json=data, ret=False)
+        return self._post('/api/connection', json=data, ret=False)
 
     def fake_ack(self):
         """Issue a connection command
@@ -257,7 +915,7 @@ class OctoRest:
         investigated and removed instead of depending on this "symptom solver".
         """
         data = {'command': 'fake_ack'}
-        self._post('/api/connection', json=data, ret=False)
+        return self._post('/api/connection', json=data, ret=False)
     
     #######################
     ### FILE OPERATIONS ###
@@ -299,8 +957,8 @@ class OctoRest:
         payload = {'recursive': str(recursive).lower()}
         if location:
             location = self._prepend_local(location)
-            return self._get('/api/files/{}'.format(location), params=payload)
-        return self._get('/api/files', params=payload)
+            return self._get('/api/files/{}'.format(location), params=payload, validate=True)
+        return self._get('/api/files', params=payload, validate=True)
 
     @contextmanager
     def _file_tuple(self, file):
@@ -349,18 +1007,22 @@ class OctoRest:
         """
         with self._file_tuple(file) as file_tuple:
             files = {'file': file_tuple}
-            data = {
-                'select': str(select).lower(),
-                'print': str(print).lower()
-            }
-            if userdata:
-                data['userdata'] = userdata
-            if path:
-                data['path'] = path
+            data = self._upload_fields(select, print, userdata, path)
 
             return self._post('/api/files/{}'.format(location),
                               files=files, json=data)
 
+    def _upload_fields(self, select, print, userdata, path):
+        data = {
+            'select': str(select).lower(),
+            'print': str(print).lower()
+        }
+        if userdata:
+            data['userdata'] = userdata
+        if path:
+            data['path'] = path
+        return data
+
     def new_folder(self, folder_name, location='local'):
         """Upload file or create folder
         http://docs.octoprint.org/en/master/api/files.html#upload-file-or-create-folder
@@ -388,7 +1050,7 @@ class OctoRest:
             'command': 'select',
             'print': print,
         }
-        self._post('/api/files/{}'.format(location), json=data, ret=False)
+        return self._post('/api/files/{}'.format(location), json=data, ret=False)
     
     def slice(self, location, slicer='curalegacy', gcode=None, position=None, printer_profile=None, 
               profile=None, select=False, print=False):
@@ -454,7 +1116,7 @@ class OctoRest:
         Location is target/filename, defaults to local/filename
         """
         location = self._prepend_local(location)
-        self._delete('/api/files/{}'.format(location))
+        return self._delete('/api/files/{}'.format(location))
     
     ######################
     ### JOB OPERATIONS ###
@@ -469,7 +1131,7 @@ class OctoRest:
         Use select() to select a file
         """
         data = {'command': 'start'}
-        self._post('/api/job', json=data, ret=False)
+        return self._post('/api/job', json=data, ret=False)
     
     def cancel(self):
         """Issue a job command
@@ -480,7 +1142,7 @@ class OctoRest:
         There must be an active print job for this to work
         """
         data = {'command': 'cancel'}
-        self._post('/api/job', json=data, ret=False)
+        return self._post('/api/job', json=data, ret=False)
     
     def restart(self):
         """Issue a job command
@@ -492,7 +1154,7 @@ class OctoRest:
         must currently be paused
         """
         data = {'command': 'restart'}
-        self._post('/api/job', json=data, ret=False)
+        return self._post('/api/job', json=data, ret=False)
 
     def pause_command(self, action):
         """Issue a job command
@@ -521,7 +1183,7 @@ class OctoRest:
             'command': 'pause',
             'action': action,
         }
-        self._post('/api/job', json=data, ret=False)
+        return self._post('/api/job', json=data, ret=False)
     
     def pause(self):
         """Issue a job command
@@ -530,7 +1192,7 @@ class OctoRest:
         Pauses the current job if it’s printing,
         does nothing if it’s already paused.
         """
-        self.pause_command(action='pause')
+        return self.pause_command(action='pause')
 
     def resume(self):
         """Issue a job command
@@ -539,7 +1201,7 @@ class OctoRest:
         Resumes the current job if it’s paused,
         does nothing if it’s printing.
         """
-        self.pause_command(action='resume')
+        return self.pause_command(action='resume')
     
     def toggle(self):
         """Issue a job command
@@ -549,7 +1211,7 @@ class OctoRest:
         pausing it if it’s printing and resuming it
         if it’s currently paused.
         """
-        self.pause_command(action='toggle')
+        return self.pause_command(action='toggle')
     
     def job_info(self):
         """Retrieve information about the current job
@@ -633,8 +1295,8 @@ class OctoRest:
         """
         version = self._version_tuple(self.version['server'])
         if version < self._version_tuple('1.3.7'):
-            self._delete('/api/logs/{}'.format(filename))
-        self._delete('/plugin/logging/logs/{}'.format(filename))
+            return self._delete('/api/logs/{}'.format(filename))
+        return self._delete('/plugin/logging/logs/{}'.format(filename))
     
     ##########################
     ### PRINTER OPERATIONS ###
@@ -699,7 +1361,7 @@ class OctoRest:
             data['y'] = y
         if z:
             data['z'] = z
-        self._post('/api/printer/printhead', json=data, ret=False)
+        return self._post('/api/printer/printhead', json=data, ret=False)
 
     def home(self, axes=None):
         """Issue a print head command
@@ -713,7 +1375,7 @@ class OctoRest:
         """
         axes = [a.lower()[:1] for a in axes] if axes else ['x', 'y', 'z']
         data = {'command': 'home', 'axes': axes}
-        self._post('/api/printer/printhead', json=data, ret=False)
+        return self._post('/api/printer/printhead', json=data, ret=False)
 
     def feedrate(self, factor):
         """Issue a print head command
@@ -725,7 +1387,7 @@ class OctoRest:
         divided by 100) between 50 and 200%.
         """
         data = {'command': 'feedrate', 'factor': factor}
-        self._post('/api/printer/printhead', json=data, ret=False)
+        return self._post('/api/printer/printhead', json=data, ret=False)
     
     @classmethod
     def _tool_dict(cls, whatever):
@@ -753,7 +1415,7 @@ class OctoRest:
         """
         targets = self._tool_dict(targets)
         data = {'command': 'target', 'targets': targets}
-        self._post('/api/printer/tool', json=data, ret=False)
+        return self._post('/api/printer/tool', json=data, ret=False)
 
     def tool_offset(self, offsets):
         """Issue a tool command
@@ -769,7 +1431,7 @@ class OctoRest:
         """
         offsets = self._tool_dict(offsets)
         data = {'command': 'offset', 'offsets': offsets}
-        self._post('/api/printer/tool', json=data, ret=False)
+        return self._post('/api/printer/tool', json=data, ret=False)
 
     def tool_select(self, tool):
         """Issue a tool command
@@ -784,7 +1446,7 @@ class OctoRest:
         if isinstance(tool, int):
             tool = 'tool{}'.format(tool)
         data = {'command': 'select', 'tool': tool}
-        self._post('/api/printer/tool', json=data, ret=False)
+        return self._post('/api/printer/tool', json=data, ret=False)
 
     def extrude(self, amount):
         """Issue a tool command
@@ -798,7 +1460,7 @@ class OctoRest:
         May be negative to retract.
         """
         data = {'command': 'extrude', 'amount': amount}
-        self._post('/api/printer/tool', json=data, ret=False)
+        return self._post('/api/printer/tool', json=data, ret=False)
 
     def retract(self, amount):
         """Issue a tool command
@@ -811,7 +1473,7 @@ class OctoRest:
         amount: The amount of filament to retract in mm.
         May be negative to extrude.
         """
-        self.extrude(-amount)
+        return self.extrude(-amount)
 
     def flowrate(self, factor):
         """Issue a tool command
@@ -823,7 +1485,7 @@ class OctoRest:
         (percentage divided by 100) between 75 and 125%.
         """
         data = {'command': 'flowrate', 'factor': factor}
-        self._post('/api/printer/tool', json=data, ret=False)
+        return self._post('/api/printer/tool', json=data, ret=False)
 
     def tool(self, history=False, limit=None):
         """Retrieve the current tool state
@@ -849,7 +1511,7 @@ class OctoRest:
         target: Target temperature to set.
         """
         data = {'command': 'target', 'target': target}
-        self._post('/api/printer/bed', json=data, ret=False)
+        return self._post('/api/printer/bed', json=data, ret=False)
 
     def bed_offset(self, offset):
         """Issue a bed command
@@ -860,7 +1522,7 @@ class OctoRest:
         offset: Temperature offset to set.
         """
         data = {'command': 'offset', 'offset': offset}
-        self._post('/api/printer/bed', json=data, ret=False)
+        return self._post('/api/printer/bed', json=data, ret=False)
 
     def bed(self, history=False, limit=None):
         """Retrieve the current bed state
@@ -886,7 +1548,7 @@ class OctoRest:
         target: Target temperature to set.
         """
         data = {'command': 'target', 'target': target}
-        self._post('/api/printer/chamber', json=data, ret=False)
+        return self._post('/api/printer/chamber', json=data, ret=False)
 
     def chamber_offset(self, offset):
         """Issue a chamber command
@@ -897,7 +1559,7 @@ class OctoRest:
         offset: Temperature offset to set.
         """
         data = {'command': 'offset', 'offset': offset}
-        self._post('/api/printer/chamber', json=data, ret=False)
+        return self._post('/api/printer/chamber', json=data, ret=False)
 
     def chamber(self, history=False, limit=None):
         """Retrieve the current chamber state
@@ -927,7 +1589,7 @@ class OctoRest:
         during connection, it will automatically attempt to initialize it.
         """
         data = {'command': 'init'}
-        self._post('/api/printer/sd', json=data, ret=False)
+        return self._post('/api/printer/sd', json=data, ret=False)
 
     def sd_refresh(self):
         """Issue an SD command
@@ -938,7 +1600,7 @@ class OctoRest:
         with sd_init().
         """
         data = {'command': 'refresh'}
-        self._post('/api/printer/sd', json=data, ret=False)
+        return self._post('/api/printer/sd', json=data, ret=False)
 
     def sd_release(self):
         """Issue an SD command
@@ -951,7 +1613,7 @@ class OctoRest:
         with sd_init().
         """
         data = {'command': 'release'}
-        self._post('/api/printer/sd', json=data, ret=False)
+        return self._post('/api/printer/sd', json=data, ret=False)
 
     def sd(self):
         """Retrieve the current SD state
@@ -971,7 +1633,7 @@ class OctoRest:
         The response will contain a list of custom control definitions.
         A 200 OK with a List all response will be returned.
         """
-        return self._get('/api/printer/command/custom')
+        return self._cached('custom_controls', self._get, '/api/printer/command/custom')
 
     def gcode(self, command):
         """Send an arbitrary command to the printer
@@ -996,8 +1658,90 @@ class OctoRest:
             data = {'command': command_lst[0]}
         else:
             data = {'commands': command_lst}
-        self._post('/api/printer/command', json=data, ret=False)
+        return self._post('/api/printer/command', json=data, ret=False)
     
+    #####################
+    ### STATUS PLUGIN ###
+    #####################
+
+    def has_status(self):
+        """
+        False while the status plugin is known to be missing (it is
+        looked for again every STATUS_RECHECK seconds), else True
+        """
+        return self._status_plugin is not False or time.monotonic() >= self._status_check
+
+    def status(self):
+        """
+        Connection state, printer state and current job in one call
+
+        Returns {'connection': state(), 'printer': printer(exclude=['sd']),
+        'job': job_info()} with the fields the panels show. A part that
+        failed holds the exception its call raised (RuntimeError for
+        the printer while it is not operational).
+
+        One request if the OctoPyClient status plugin is installed in
+        OctoPrint (see: plugin/ in the source tree), the three calls
+        otherwise or when the plugin does not answer OK.
+        """
+        if self.has_status():
+            response = self._call('GET', self.STATUS_PATH, 'status', stream=True)
+            body = self._body(response, self.STATUS_PATH)
+            if self._status_usable(response.status_code):
+                return self._split_status(self._decode(body))
+
+        status = {}
+        error = None
+        for name, call in self._status_calls():
+            if error is not None:
+                # Unreachable - the other calls would fail the same way
+                status[name] = error
+                continue
+            try:
+                status[name] = call()
+            except OSError as err:
+                status[name] = error = err
+            except Exception as err:
+                status[name] = err
+        return status
+
+    def _status_calls(self):
+        """
+        (part, call) of status() without the plugin
+        """
+        return (('connection', self.state),
+                ('printer', lambda: self.printer(exclude=['sd'])),
+                ('job', self.job_info))
+
+    def _status_usable(self, status_code):
+        """
+        True for an OK status plugin reply, else the plain endpoints
+        are used until it is looked for again
+        """
+        if 200 <= status_code < 210:
+            self._status_plugin = True
+            return True
+        # Not installed or removed (404), not allowed (403) or failing (5xx)
+        self._status_plugin = False
+        self._status_check = time.monotonic() + self.STATUS_RECHECK
+        self._count('status_plugin_missing' if status_code == 404 else 'status_plugin_failed')
+        return False
+
+    def _split_status(self, data):
+        """
+        status() parts of a status plugin reply
+        """
+        state = data['state']
+        if data.get('temperature') is None:
+            # What /api/printer answers (409 Conflict)
+            printer = RuntimeError('Reply for {}/api/printer was not OK: Printer is not operational (409)'
+                                   .format(self.url))
+        else:
+            printer = {'state': state, 'temperature': data['temperature']}
+        return {'connection': state['text'],
+                'printer': printer,
+                'job': {'job': data['job'], 'progress': data['progress'], 'state': state['text']}}
+
     ##################################
     ### PRINTER PROFILE OPERATIONS ###
     ##################################
@@ -1008,7 +1752,7 @@ class OctoRest:
 
         Retrieves a list of all configured printer profiles.
         """
-        return self._get('/api/printerprofiles')
+        return self._cached('printer_profile', self._get_validated, '/api/printerprofiles')
 
     def printer_profile(self, profile=None):
         """Retrieve specific printer profile
@@ -1019,7 +1763,8 @@ class OctoRest:
         # Use default if none given
         if profile is None:
             profile='_default'
-        return self._get('/api/printerprofiles/{}'.format(profile))
+        return self._cached('printer_profile', self._get_validated,
+                            '/api/printerprofiles/{}'.format(profile))
 
     def add_printer_profile(self, profile_data):
         """Add a new printer profile
@@ -1027,7 +1772,7 @@ class OctoRest:
 
         TODO: Implement this
         """
-        return self._post('/api/printerprofiles', json=profile_data)
+        return self._write('POST', '/api/printerprofiles', ['printer_profile'], json=profile_data)
 
     def update_printer_profile(self, profile, profile_data):
         """Update an existing printer profile
@@ -1035,7 +1780,8 @@ class OctoRest:
 
         TODO: Implement this
         """
-        return self._patch('/api/printerprofiles/{}'.format(profile), json=profile_data)
+        return self._write('PATCH', '/api/printerprofiles/{}'.format(profile), ['printer_profile'],
+                           json=profile_data)
 
     def delete_printer_profile(self, profile):
         """Remove an existing printer profile
@@ -1046,7 +1792,7 @@ class OctoRest:
         If the profile to be deleted is the currently selected profile, 
         a 409 Conflict will be returned.
         """
-        return self._delete('/api/printerprofiles/{}'.format(profile))
+        return self._write('DELETE', '/api/printerprofiles/{}'.format(profile), ['printer_profile'])
     
     ################
     ### SETTINGS ###
@@ -1074,15 +1820,16 @@ class OctoRest:
         http://docs.octoprint.org/en/master/configuration/config_yaml.html#config-yaml
         """
         if settings:
-            return self._post('/api/settings', json=settings, ret=True)
+            return self._write('POST', '/api/settings', ['settings', 'custom_controls', 'system_commands'],
+                               json=settings, ret=True)
         else:
-            return self._get('/api/settings')
+            return self._cached('settings', self._get_validated, '/api/settings')
     
     def regenerate_apikey(self):
         """Regenerate the system wide API key
         http://docs.octoprint.org/en/master/api/settings.html#regenerate-the-system-wide-api-key
         """
-        return self._post('/api/settings/apikey')
+        return self._write('POST', '/api/settings/apikey', ['settings'])
     
     def fetch_templates(self):
         """Fetch template data
@@ -1169,7 +1916,7 @@ class OctoRest:
         Retrieves all configured system commands.
         A 200 OK with a List all response will be returned.
         """
-        return self._get('/api/system/commands')
+        return self._cached('system_commands', self._get, '/api/system/commands')
     
     def source_system_commands(self, source):
         """List all registered system commands for a source
@@ -1194,8 +1941,8 @@ class OctoRest:
             currently either core or custom
             action – The identifier of the command, action from its definition
         """
-
-        return self._post('/api/system/commands/{}/{}'.format(source, action), ret=False)
+        return self._write('POST', '/api/system/commands/{}/{}'.format(source, action),
+                           ['system_commands'], ret=False)
     
     #################
     ### TIMELAPSE ###
@@ -1222,7 +1969,7 @@ class OctoRest:
 
         Requires user rights
         """
-        self._delete('/api/timelapse/{}'.format(filename))
+        return self._delete('/api/timelapse/{}'.format(filename))
     
     def render_timelapse(self, name):
         """Issue a command for an unrendered timelapse
@@ -1245,7 +1992,7 @@ class OctoRest:
         """Delete an unrendered timelapse
         http://docs.octoprint.org/en/master/api/timelapse.html#delete-an-unrendered-timelapse
         """
-        self._delete('/api/timelapse/unrendered/{}'.format(filename))
+        return self._delete('/api/timelapse/unrendered/{}'.format(filename))
 
     def change_timelapse_config(self, type):
         """Change current timelapse config
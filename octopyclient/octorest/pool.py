@@ -0,0 +1,349 @@
+"""
+urllib3 connection pool parts shared by the HTTP transports
+
+Host name cache, TLS session resumption, idle connection reaping,
+Unix socket connections and the retry of requests on stale keep-alive
+sockets. Only urllib3 is
+needed (see: transport.PooledAdapter, direct.DirectTransport).
+"""
+
+import bisect
+import ipaddress
+import socket
+import ssl
+import threading
+import time
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError, ProtocolError, ReadTimeoutError
+from urllib3.util.retry import Retry
+
+# Methods that may be re-sent when a kept-alive socket turns out closed
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+class _StaleRetry(Retry):
+    """
+    Retry of requests that failed on a stale keep-alive socket only
+
+    urllib3 counts read timeouts as read errors - they are not retried
+    here and raised as is, the caller's timeout and deadline stand.
+    """
+
+    def _is_read_error(self, err):
+        return isinstance(err, ProtocolError)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        # Raised as is, not as MaxRetryError - requests reports it as a timeout
+        if isinstance(error, ReadTimeoutError):
+            raise error
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+def stale_retry():
+    """
+    One quick retry of idempotent requests on a connection the server
+    closed while it was idle in the pool (RemoteDisconnected). Timeouts
+    and failed connects are not retried.
+    """
+    kwargs = dict(total=1, connect=0, read=1, status=0, redirect=0,
+                  raise_on_status=False)
+    try:
+        return _StaleRetry(allowed_methods=IDEMPOTENT_METHODS, other=0, **kwargs)
+    except TypeError:
+        # urllib3 < 1.26 cannot tell read timeouts from stale sockets - no retry
+        return Retry(method_whitelist=IDEMPOTENT_METHODS, **dict(kwargs, read=0))
+
+class HostResolver:
+    """
+    Host name to address cache
+
+    An address is resolved once and kept for ttl seconds. Past
+    refresh * ttl it is re-resolved in the background, an expired
+    address is still used while the background lookup runs. When
+    resolution fails the last known-good address is kept. Only the
+    first lookup of a host blocks the caller.
+    """
+
+    # Upper bounds (sec) of the resolution time histogram
+    BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, float('inf'))
+
+    def __init__(self, ttl=300, refresh=0.8):
+        self.ttl = ttl
+        self.refresh = refresh
+        self._cache = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.histogram = [0] * len(self.BUCKETS)
+        self.failures = 0
+
+    def resolve(self, host, port):
+        """
+        Address to connect to for host
+
+        Raises socket.gaierror if host was never resolved and
+        resolution fails
+        """
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+
+        with self._lock:
+            entry = self._cache.get(host)
+        if entry is None:
+            return self._lookup(host, port)
+
+        address, stamp = entry
+        if time.monotonic() - stamp > self.refresh * self.ttl:
+            self.invalidate(host, port)
+        return address
+
+    def invalidate(self, host, port):
+        """
+        Re-resolve host in the background, keep using the current address
+        """
+        with self._lock:
+            if host in self._pending or host not in self._cache:
+                return
+            self._pending.add(host)
+        threading.Thread(target=self._refresh, args=(host, port),
+                         name='resolve', daemon=True).start()
+
+    def _refresh(self, host, port):
+        try:
+            self._lookup(host, port)
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._pending.discard(host)
+
+    def _lookup(self, host, port):
+        start = time.monotonic()
+        try:
+            info = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        except OSError:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.histogram[bisect.bisect_left(self.BUCKETS, elapsed)] += 1
+
+        address = info[0][4][0]
+        with self._lock:
+            self._cache[host] = (address, time.monotonic())
+        return address
+
+    def stats(self):
+        """
+        Lookup count per resolution time bucket ({upper bound: count})
+        and the number of failed lookups
+        """
+        with self._lock:
+            return {'histogram': dict(zip(self.BUCKETS, self.histogram)),
+                    'failures': self.failures}
+
+# Shared by all pooled sessions - survives reconnects
+default_resolver = HostResolver()
+
+class _ResolvedConnection:
+    """
+    Connection mixin connecting to the resolver's cached address
+
+    TLS server name and certificate checks still use the host name.
+    """
+    resolver = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        self._dns_host = self.resolver.resolve(host, self.port)
+        try:
+            return super()._new_conn()
+        except OSError:
+            # Host may have moved - look it up again for next time
+            self.resolver.invalidate(host, self.port)
+            raise
+        finally:
+            self._dns_host = host
+
+class _UnixConnection:
+    """
+    Connection mixin connecting to the Unix socket socket_path instead
+    of host:port, the host is only sent in the Host header
+
+    No TCP socket options apply, errors are raised as urllib3 raises
+    those of TCP connections.
+    """
+    socket_path = None
+
+    def _new_conn(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            if isinstance(self.timeout, (int, float)):
+                sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        except socket.timeout as err:
+            sock.close()
+            raise ConnectTimeoutError(self, 'Connection to {} timed out'.format(self.socket_path)) from err
+        except OSError as err:
+            sock.close()
+            raise NewConnectionError(self, 'Failed to connect to {}: {}'.format(self.socket_path, err)) from err
+        return sock
+
+class ResumingContext(ssl.SSLContext):
+    """
+    TLS client context resuming sessions per server name
+
+    The last session of a server is offered on every new connection,
+    so only the first one (and those after the server dropped the
+    session) does a full handshake. Counts handshakes, resumed ones
+    and the time spent in them.
+    """
+
+    def __new__(cls, protocol=ssl.PROTOCOL_TLS_CLIENT, *args, **kwargs):
+        return super().__new__(cls, protocol, *args, **kwargs)
+
+    def __init__(self, protocol=ssl.PROTOCOL_TLS_CLIENT):
+        self._sessions = {}
+        self._slock = threading.Lock()
+        self.handshakes = 0
+        self.resumed = 0
+        self.handshake_time = 0.0
+
+    def wrap_socket(self, sock, *args, server_hostname=None, **kwargs):
+        if kwargs.get('session') is None:
+            with self._slock:
+                kwargs['session'] = self._sessions.get(server_hostname)
+        start = time.monotonic()
+        try:
+            ssock = super().wrap_socket(sock, *args, server_hostname=server_hostname, **kwargs)
+        except ssl.SSLError:
+            # Session refused - forget it, next connection does a full handshake
+            with self._slock:
+                self._sessions.pop(server_hostname, None)
+            raise
+        elapsed = time.monotonic() - start
+        with self._slock:
+            self.handshakes += 1
+            self.handshake_time += elapsed
+            if ssock.session_reused:
+                self.resumed += 1
+        self.save(ssock)
+        return ssock
+
+    def save(self, ssock):
+        """
+        Keep the session of ssock for its server
+
+        TLS 1.3 tickets arrive after the handshake, sockets are saved
+        again when returned to the pool
+        """
+        session = getattr(ssock, 'session', None)
+        if session is not None and ssock.server_hostname:
+            with self._slock:
+                self._sessions[ssock.server_hostname] = session
+
+    def stats(self):
+        with self._slock:
+            return {'tls_handshakes': self.handshakes,
+                    'tls_resumed': self.resumed,
+                    'tls_time': self.handshake_time}
+
+def tls_context():
+    """
+    ResumingContext with the default CA certificates
+
+    Certificate and host name verification follow the session's
+    'verify' setting (CA bundle path or False) as usual - urllib3
+    sets the verify mode per connection and matches host names itself
+    """
+    context = ResumingContext()
+    context.check_hostname = False
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_default_certs()
+    return context
+
+class _ReapingPool:
+    """
+    Connection pool mixin closing connections idle for too long
+    before they are reused
+    """
+    idle_timeout = None
+    num_opened = 0
+    num_reaped = 0
+
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        last = getattr(conn, 'last_used', None)
+        if last is not None and getattr(conn, 'sock', None) is not None:
+            if time.monotonic() - last > self.idle_timeout:
+                conn.close()
+                self.num_reaped += 1
+        # New, reaped or dropped (closed by urllib3) - will connect
+        if getattr(conn, 'sock', None) is None:
+            self.num_opened += 1
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.last_used = time.monotonic()
+            sock = getattr(conn, 'sock', None)
+            if isinstance(getattr(sock, 'context', None), ResumingContext):
+                sock.context.save(sock)
+        super()._put_conn(conn)
+
+# Socket options of pooled connections
+SOCKET_OPTIONS = [
+    (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+def pool_classes(idle_timeout, resolver, socket_path=None):
+    """
+    Reaping connection pool classes by scheme for a urllib3 PoolManager,
+    their connections resolve host names through resolver. With
+    socket_path, http connections go to that Unix socket whatever the
+    host
+    """
+    resolved = {'resolver': resolver}
+    if socket_path is not None:
+        http = dict(idle_timeout=idle_timeout,
+                    ConnectionCls=type('UnixHTTPConnection', (_UnixConnection, HTTPConnection),
+                                       {'socket_path': socket_path}))
+    else:
+        http = dict(idle_timeout=idle_timeout,
+                    ConnectionCls=type('ResolvedHTTPConnection', (_ResolvedConnection, HTTPConnection), resolved))
+    https = dict(idle_timeout=idle_timeout,
+                 ConnectionCls=type('ResolvedHTTPSConnection', (_ResolvedConnection, HTTPSConnection), resolved))
+    return {
+        'http': type('ReapingHTTPConnectionPool', (_ReapingPool, HTTPConnectionPool), http),
+        'https': type('ReapingHTTPSConnectionPool', (_ReapingPool, HTTPSConnectionPool), https),
+    }
+
+def pool_stats(pools, tls):
+    """
+    Connection counters summed over pools
+
+    connections: new TCP connections opened
+    requests: requests sent
+    reaped: idle connections closed before reuse
+    reuse: fraction of requests sent on an existing connection
+    tls_handshakes, tls_resumed, tls_time: TLS handshakes, resumed
+    ones and total handshake time (sec) of the ResumingContext tls
+    """
+    stats = {'connections': 0, 'requests': 0, 'reaped': 0}
+    stats.update(tls.stats())
+    for pool in pools:
+        if pool is None:
+            continue
+        stats['connections'] += getattr(pool, 'num_opened', pool.num_connections)
+        stats['requests'] += pool.num_requests
+        stats['reaped'] += getattr(pool, 'num_reaped', 0)
+    if stats['requests']:
+        stats['reuse'] = 1 - min(stats['connections'], stats['requests']) / stats['requests']
+    else:
+        stats['reuse'] = 0.0
+    return stats
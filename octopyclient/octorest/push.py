@@ -0,0 +1,263 @@
+import json
+import logging
+import socket
+import threading
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+log = logging.getLogger('OctoPyClient')
+
+# Printer states without /api/printer data (REST answers 409 Conflict)
+_NOT_CONNECTED = ('Offline', 'Closed', 'Opening', 'Detecting', 'Connecting',
+                  'Error', 'Unknown')
+
+# /api/printer state flags set per state text - events only carry the text
+_FLAGS = {
+    'Operational': ('operational', 'ready'),
+    'Starting': ('operational', 'printing'),
+    'Starting print from SD': ('operational', 'printing'),
+    'Printing': ('operational', 'printing'),
+    'Printing from SD': ('operational', 'printing'),
+    'Sending file to SD': ('operational', 'printing'),
+    'Pausing': ('operational', 'pausing'),
+    'Paused': ('operational', 'paused'),
+    'Resuming': ('operational', 'printing', 'resuming'),
+    'Cancelling': ('operational', 'cancelling'),
+    'Finishing': ('operational', 'printing', 'finishing'),
+    'Error': ('error', 'closedOrError'),
+    'Offline after error': ('error', 'closedOrError'),
+}
+_FLAG_NAMES = ('operational', 'paused', 'printing', 'pausing', 'cancelling', 'sdReady',
+               'error', 'ready', 'closedOrError', 'finishing', 'resuming')
+
+def state_flags(text):
+    """
+    Flags of /api/printer 'state' for a state text
+    """
+    on = _FLAGS.get(text, ('closedOrError',))
+    return {name: name in on for name in _FLAG_NAMES}
+
+class StateSnapshot:
+    """
+    Printer, job and connection state kept from pushed messages
+
+    The snapshot is returned in the same shape as the corresponding
+    OctoRest calls so callers can use either one. Subclasses receive
+    the messages and set _live (see: OctoPush, mqtt.OctoMqtt).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._live = False
+
+        self._state = None
+        self._job = None
+        self._progress = None
+        self._temps = {}
+        self._offsets = {}
+
+    @property
+    def is_live(self):
+        """
+        True while connected and a snapshot was received
+        """
+        return self._live
+
+    def _update(self, data):
+        with self._lock:
+            if data.get('state'):
+                self._state = data['state']
+            if data.get('job') is not None:
+                self._job = data['job']
+            if data.get('progress') is not None:
+                self._progress = data['progress']
+            if data.get('offsets') is not None:
+                self._offsets = data['offsets']
+            # Only the latest temperature sample is kept
+            if data.get('temps'):
+                temps = dict(data['temps'][-1])
+                temps.pop('time', None)
+                self._temps = temps
+
+    #######################
+    ### SNAPSHOT ACCESS ###
+    #######################
+
+    def _snapshot(self):
+        if not self._live:
+            raise RuntimeError('State push is not live')
+        return self._lock
+
+    def connection_info(self):
+        """
+        Same as OctoRest.connection_info(), only 'current.state' is populated
+        """
+        with self._snapshot():
+            text = self._state['text'] if self._state else 'Unknown'
+        return {'current': {'state': text}}
+
+    def state(self):
+        """
+        A shortcut to get the current state.
+        """
+        return self.connection_info()['current']['state']
+
+    def printer(self, *, exclude=None):
+        """
+        Same as OctoRest.printer(), without SD state
+        """
+        with self._snapshot():
+            state = self._state
+            temperature = {}
+            for tool, temp in self._temps.items():
+                temperature[tool] = dict(temp, offset=self._offsets.get(tool, 0))
+
+        if state is None or state['text'] in _NOT_CONNECTED:
+            raise RuntimeError('Printer is not operational')
+
+        result = {'temperature': temperature, 'state': state}
+        for item in exclude or []:
+            result.pop(item, None)
+        return result
+
+    def tool(self):
+        """
+        Same as OctoRest.tool()
+        """
+        temperature = self.printer(exclude=['state'])['temperature']
+        return {k: v for k, v in temperature.items() if k.startswith('tool')}
+
+    def job_info(self):
+        """
+        Same as OctoRest.job_info()
+        """
+        with self._snapshot():
+            if self._job is None:
+                raise RuntimeError('No job data received')
+            return {'job': self._job,
+                    'progress': self._progress,
+                    'state': self._state['text'] if self._state else 'Unknown'}
+
+class OctoPush(StateSnapshot):
+    """
+    Live printer, job and connection state from OctoPrint's push API
+
+    Subscribes to the raw websocket transport of the SockJS endpoint and
+    keeps a snapshot of the last 'current'/'history' messages and state
+    change events.
+    """
+
+    def __init__(self, client, *, throttle=1, retry=5):
+        """
+        Initialize with a connected OctoRest client
+
+        throttle is the push rate multiplier (base 500ms) requested from
+        OctoPrint. retry is the delay in seconds before reconnecting.
+        """
+        if websocket is None:
+            raise RuntimeError('websocket-client is not installed')
+        super().__init__()
+
+        self.client = client
+        self.throttle = throttle
+        self.retry = retry
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._ws = None
+
+    def start(self):
+        """
+        Start the push receiver thread
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='octo_push', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Close the socket and stop the receiver thread
+        """
+        self._stop.set()
+        self._live = False
+        ws = self._ws
+        if ws is not None:
+            ws.close()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    #######################
+    ### SOCKET HANDLING ###
+    #######################
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                user = self.client.login(passive=True)
+                auth = '{}:{}'.format(user['name'], user['session'])
+                kwargs = {}
+                if self.client.socket_path is not None:
+                    # Same Unix socket as the REST calls
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.connect(self.client.socket_path)
+                    kwargs['socket'] = sock
+                self._ws = websocket.WebSocketApp(
+                    self.client.push_url(),
+                    on_open=lambda ws: self._on_open(ws, auth),
+                    on_message=self._on_message,
+                    on_error=self._on_error,
+                    on_close=self._on_close,
+                    **kwargs)
+                self._ws.run_forever(ping_interval=10, ping_timeout=5)
+            except Exception as err:
+                log.debug("Push socket: {}".format(str(err)))
+            finally:
+                self._live = False
+                self._ws = None
+
+            self._stop.wait(self.retry)
+
+        log.info("Push socket - exit")
+
+    def _on_open(self, ws, auth):
+        log.info("Push socket connected")
+        ws.send(json.dumps({'auth': auth}))
+        ws.send(json.dumps({'throttle': self.throttle}))
+
+    def _on_message(self, ws, message):
+        try:
+            msg = json.loads(message)
+        except ValueError:
+            return
+
+        for kind, data in msg.items():
+            if kind in ('current', 'history'):
+                self._update(data)
+                self._live = True
+            elif kind == 'event':
+                self._event(data)
+
+    def _on_error(self, ws, err):
+        log.debug("Push socket error: {}".format(str(err)))
+
+    def _on_close(self, ws, *args):
+        self._live = False
+        log.info("Push socket closed")
+
+    def _event(self, data):
+        # Keep connection state current between 'current' messages
+        if data.get('type') == 'PrinterStateChanged':
+            text = data.get('payload', {}).get('state_string')
+            if text:
+                with self._lock:
+                    # Flags of the new state, SD card state is not in the event
+                    flags = state_flags(text)
+                    flags['sdReady'] = (self._state or {}).get('flags', {}).get('sdReady', False)
+                    self._state = {'text': text, 'flags': flags}
+        elif data.get('type') == 'Disconnected':
+            with self._lock:
+                self._state = {'text': 'Offline', 'flags': state_flags('Offline')}
+                self._temps = {}
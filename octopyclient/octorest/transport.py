@@ -0,0 +1,116 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ReadTimeoutError
+
+from .octorest import Transport
+from .pool import (SOCKET_OPTIONS, default_resolver, pool_classes, pool_stats,
+                   stale_retry, tls_context)
+
+class PooledAdapter(HTTPAdapter):
+    """
+    HTTPAdapter with an explicit keep-alive connection policy
+
+    pool_size connections are kept per host (callers block rather than
+    open throw-away connections), TCP_NODELAY and SO_KEEPALIVE are set
+    and connections idle longer than idle_timeout seconds are closed
+    instead of being reused. Host names are resolved through resolver
+    (default: the shared default_resolver). https connections resume
+    TLS sessions (see: ResumingContext). With socket_path, http
+    connections go to that Unix socket (see: use_socket).
+    """
+
+    def __init__(self, pool_size=4, idle_timeout=15, resolver=None, socket_path=None):
+        self.idle_timeout = idle_timeout
+        self.resolver = resolver or default_resolver
+        self.socket_path = socket_path
+        self.tls = tls_context()
+        super().__init__(pool_connections=1, pool_maxsize=pool_size,
+                         pool_block=True, max_retries=stale_retry())
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs['socket_options'] = SOCKET_OPTIONS
+        pool_kwargs['ssl_context'] = self.tls
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = pool_classes(self.idle_timeout, self.resolver,
+                                                               self.socket_path)
+
+    def use_socket(self, socket_path):
+        """
+        Send http requests to the Unix socket socket_path from now on
+        """
+        self.socket_path = socket_path
+        self.poolmanager.clear()
+        self.poolmanager.pool_classes_by_scheme = pool_classes(self.idle_timeout, self.resolver,
+                                                               socket_path)
+
+    def stats(self):
+        """
+        Connection counters summed over all pools (see: pool.pool_stats)
+        """
+        pools = self.poolmanager.pools
+        return pool_stats([pools.get(key) for key in list(pools.keys())], self.tls)
+
+def pooled_session(pool_size=4, idle_timeout=15, resolver=None):
+    """
+    requests.Session using PooledAdapter for http and https
+    """
+    sess = requests.Session()
+    adapter = PooledAdapter(pool_size=pool_size, idle_timeout=idle_timeout, resolver=resolver)
+    sess.mount('http://', adapter)
+    sess.mount('https://', adapter)
+    return sess
+
+class RequestsTransport(Transport):
+    """
+    OctoRest transport over a requests.Session (default: a new one)
+    """
+
+    def __init__(self, session=None):
+        self.session = session or requests.Session()
+
+    def setup(self, url, headers, socket_path=None):
+        super().setup(url, headers, socket_path)
+        self.session.headers.update(headers)
+        if socket_path is not None:
+            adapter = self.session.get_adapter(url)
+            if isinstance(adapter, PooledAdapter):
+                adapter.use_socket(socket_path)
+            else:
+                self.session.mount(url, PooledAdapter(socket_path=socket_path))
+
+    def request(self, method, path, **kwargs):
+        return self.session.request(method, self.url + path, **kwargs)
+
+    def classify(self, err):
+        if isinstance(err, requests.exceptions.SSLError):
+            return 'tls'
+        if isinstance(err, requests.exceptions.Timeout):
+            return 'timeout'
+        if isinstance(err, requests.exceptions.ConnectionError):
+            # Read timeout while streaming a reply body, or given up on by urllib3
+            reason = err.args[0] if err.args else None
+            if isinstance(reason, MaxRetryError):
+                reason = reason.reason
+            if isinstance(reason, ReadTimeoutError):
+                return 'timeout'
+            return 'connection'
+        return super().classify(err)
+
+    def stats(self):
+        """
+        Connection counters of the session's adapters (if provided)
+        """
+        stats = {}
+        for adapter in set(self.session.adapters.values()):
+            if hasattr(adapter, 'stats'):
+                for k, v in adapter.stats().items():
+                    if k != 'reuse':
+                        stats[k] = stats.get(k, 0) + v
+        if stats.get('requests'):
+            stats['reuse'] = 1 - min(stats['connections'], stats['requests']) / stats['requests']
+        elif stats:
+            stats['reuse'] = 0.0
+        return stats
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,630 @@
+"""
+OctoRest in a separate network worker process
+
+The worker polls connection, printer and job state and publishes the
+latest values into a fixed-layout shared memory block (see: LAYOUT).
+The UI process reads the block without locks or pickling through
+WorkerSource, which has the same snapshot interface as OctoPush.
+Other OctoRest calls (commands, files, settings ...) go to the worker
+over a pipe through WorkerClient.
+
+Main loop frame latency, in-process polling vs worker:
+    $ python -m octopyclient.octorest.worker http://octopi APIKEY [SECONDS]
+"""
+
+import ctypes
+import itertools
+import logging
+import math
+import multiprocessing
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from .budget import RequestThrottled
+from .octorest import OctoRest, RequestTimeout, background, critical, make_transport, _critical, _deadline
+
+log = logging.getLogger('OctoPyClient')
+
+# Snapshot slices and their poll interval (sec) in the worker
+SCHEDULE = {'connection': 2, 'printer': 1, 'job': 2}
+# Job interval while no job is running
+JOB_IDLE = 5
+# Longest wait (sec) between polls while OctoPrint fails
+RETRY_CAP = 30
+# Snapshot older than this (sec) is not live - worker stalled or gone
+STALE = 3
+
+# Printer state flags and temperature sensors of the fixed layout
+FLAGS = ('operational', 'paused', 'printing', 'pausing', 'cancelling', 'sdReady',
+         'error', 'ready', 'closedOrError', 'finishing', 'resuming')
+SENSORS = ('tool0', 'tool1', 'tool2', 'tool3', 'bed', 'chamber')
+
+TEXT = 64       # State text bytes
+ERROR = 160     # Error text bytes per slice
+NAME = 256      # Job file name / path bytes
+
+# Slice status
+EMPTY, OK, FAILED = 0, 1, 2
+
+# Block layout after the sequence counter, little-endian, no padding:
+#   heartbeat (monotonic time of the last write)
+#   per slice: status, error text
+#   connection: state text
+#   printer: flags bitmask, per sensor: present, actual, target, offset
+#   job: name, path, origin, size, estimated / last print time,
+#        completion, file position, print time, print time left
+# None is stored as NaN (floats) or -1 (integers)
+_SEQ = struct.Struct('<Q')
+LAYOUT = struct.Struct('<d' + 'B{:d}s'.format(ERROR) * len(SCHEDULE)
+                       + '{:d}s'.format(TEXT)
+                       + 'I' + '?ddd' * len(SENSORS)
+                       + '{0:d}s{0:d}s16sqdddqdd'.format(NAME))
+SIZE = _SEQ.size + LAYOUT.size
+
+def _text(value, size):
+    return (value or '').encode('utf-8')[:size]
+
+def _untext(raw):
+    return raw.rstrip(b'\0').decode('utf-8', 'replace')
+
+def _float(value):
+    return float('nan') if value is None else float(value)
+
+def _unfloat(value):
+    return None if math.isnan(value) else value
+
+def _int(value):
+    return -1 if value is None else int(value)
+
+def _unint(value):
+    return None if value < 0 else value
+
+def encode(slices):
+    """
+    LAYOUT values of slices: {name: data or Exception} as returned by
+    state(), printer() and job_info(), missing slices are empty
+    """
+    values = [time.monotonic()]
+    for name in SCHEDULE:
+        data = slices.get(name)
+        if data is None:
+            values += [EMPTY, b'']
+        elif isinstance(data, Exception):
+            values += [FAILED, _text(str(data), ERROR)]
+        else:
+            values += [OK, b'']
+
+    connection = slices.get('connection')
+    values.append(_text(connection if isinstance(connection, str) else None, TEXT))
+
+    printer = slices.get('printer')
+    if not isinstance(printer, dict):
+        printer = {}
+    flags = printer.get('state', {}).get('flags', {})
+    values.append(sum(1 << i for i, name in enumerate(FLAGS) if flags.get(name)))
+    temperature = printer.get('temperature') or {}
+    for sensor in SENSORS:
+        temp = temperature.get(sensor)
+        if temp is None:
+            values += [False, 0.0, 0.0, 0.0]
+        else:
+            values += [True, _float(temp.get('actual')), _float(temp.get('target')),
+                       _float(temp.get('offset', 0))]
+
+    job = slices.get('job')
+    if not isinstance(job, dict):
+        job = {}
+    info = job.get('job') or {}
+    file = info.get('file') or {}
+    progress = job.get('progress') or {}
+    values += [_text(file.get('name'), NAME), _text(file.get('path'), NAME),
+               _text(file.get('origin'), 16), _int(file.get('size')),
+               _float(info.get('estimatedPrintTime')), _float(info.get('lastPrintTime')),
+               _float(progress.get('completion')), _int(progress.get('filepos')),
+               _float(progress.get('printTime')), _float(progress.get('printTimeLeft'))]
+    return values
+
+class SharedSnapshot:
+    """
+    Seqlock over a shared buffer of SIZE bytes
+
+    The single writer makes the sequence counter odd while it writes
+    the values and even again when done. Readers never block the
+    writer: a read that saw an odd or changed counter is repeated.
+    """
+
+    def __init__(self, buf):
+        self.buf = memoryview(buf).cast('B')
+        # A restarted writer continues the sequence
+        self._seq = _SEQ.unpack_from(self.buf)[0] & ~1
+
+    def write(self, values):
+        self._seq += 1
+        _SEQ.pack_into(self.buf, 0, self._seq)
+        LAYOUT.pack_into(self.buf, _SEQ.size, *values)
+        self._seq += 1
+        _SEQ.pack_into(self.buf, 0, self._seq)
+
+    def read(self):
+        """
+        Consistent LAYOUT values and their sequence number, None if
+        nothing was written yet
+        """
+        for _ in range(1000):
+            seq = _SEQ.unpack_from(self.buf)[0]
+            if seq == 0:
+                return None, 0
+            if seq & 1:
+                continue
+            values = LAYOUT.unpack_from(self.buf, _SEQ.size)
+            if _SEQ.unpack_from(self.buf)[0] == seq:
+                return values, seq
+        raise RuntimeError('Snapshot is being written')
+
+class WorkerSource:
+    """
+    Printer, job and connection state published by the worker
+
+    Same interface as OctoPush: results have the shape of the OctoRest
+    calls, without the fields not kept in the layout (SD state, job
+    filament and user). Failed polls raise RuntimeError with the
+    worker's error text.
+    """
+
+    def __init__(self, buf):
+        self.snapshot = SharedSnapshot(buf)
+        self._decoded = (0, None)
+
+    @property
+    def is_live(self):
+        """
+        True while the worker updates the block and reaches OctoPrint
+        """
+        try:
+            state = self._state()
+        except RuntimeError:
+            return False
+        if state is None or time.monotonic() - state['heartbeat'] > STALE:
+            return False
+        return state['status']['connection'][0] == OK
+
+    def _state(self):
+        values, seq = self.snapshot.read()
+        if values is None:
+            return None
+        cached_seq, state = self._decoded
+        if seq == cached_seq:
+            return state
+
+        values = iter(values)
+        state = {'heartbeat': next(values), 'status': {}}
+        for name in SCHEDULE:
+            state['status'][name] = (next(values), _untext(next(values)))
+        state['text'] = _untext(next(values))
+
+        flags = next(values)
+        temperature = {}
+        for sensor in SENSORS:
+            present, actual, target, offset = [next(values) for _ in range(4)]
+            if present:
+                temperature[sensor] = {'actual': _unfloat(actual), 'target': _unfloat(target),
+                                       'offset': _unfloat(offset)}
+        state['printer'] = {'state': {'text': state['text'],
+                                      'flags': {name: bool(flags & 1 << i)
+                                                for i, name in enumerate(FLAGS)}},
+                            'temperature': temperature}
+
+        name, path, origin, size, estimated, last, completion, filepos, printTime, left = values
+        state['job'] = {'job': {'file': {'name': _untext(name) or None, 'path': _untext(path) or None,
+                                         'origin': _untext(origin) or None, 'size': _unint(size)},
+                                'estimatedPrintTime': _unfloat(estimated),
+                                'lastPrintTime': _unfloat(last)},
+                        'progress': {'completion': _unfloat(completion), 'filepos': _unint(filepos),
+                                     'printTime': _unfloat(printTime),
+                                     'printTimeLeft': _unfloat(left)},
+                        'state': state['text']}
+        self._decoded = (seq, state)
+        return state
+
+    def _slice(self, name):
+        state = self._state()
+        if state is None:
+            raise RuntimeError('No state from network worker')
+        status, error = state['status'][name]
+        if status == FAILED:
+            raise RuntimeError(error)
+        if status == EMPTY:
+            raise RuntimeError('No {} data from network worker'.format(name))
+        return state
+
+    def connection_info(self):
+        """
+        Same as OctoRest.connection_info(), only 'current.state' is populated
+        """
+        return {'current': {'state': self._slice('connection')['text']}}
+
+    def state(self):
+        """
+        A shortcut to get the current state.
+        """
+        return self._slice('connection')['text']
+
+    def printer(self, *, exclude=None):
+        """
+        Same as OctoRest.printer(), without SD state
+        """
+        result = dict(self._slice('printer')['printer'])
+        for item in exclude or []:
+            result.pop(item, None)
+        return result
+
+    def tool(self):
+        """
+        Same as OctoRest.tool()
+        """
+        temperature = self.printer(exclude=['state'])['temperature']
+        return {k: v for k, v in temperature.items() if k.startswith('tool')}
+
+    def job_info(self):
+        """
+        Same as OctoRest.job_info()
+        """
+        return self._slice('job')['job']
+
+class WorkerClient:
+    """
+    OctoRest calls sent to the network worker
+
+    Any OctoRest method can be called, arguments and results must
+    pickle (no open files). Calls are bound by the caller's deadline()
+    or else by the longest OctoRest timeout. Of the data attributes
+    only 'version' is available.
+    """
+
+    def __init__(self, worker):
+        self._worker = worker
+        self.version = None
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._worker.call(name, args, kwargs)
+
+class NetworkWorker:
+    """
+    UI side of the network worker process
+
+    start() launches the process, open() has it connect to OctoPrint.
+    'client' sends OctoRest calls to it, 'source' reads the state it
+    publishes. Options are those of OctoRest plus 'connections' (pool
+    size), 'transport' (see: make_transport), 'budget' (RequestBudget
+    arguments for its polling) and 'schedule' (poll intervals
+    replacing those of SCHEDULE).
+    """
+
+    def __init__(self, url, apikey, **options):
+        self.url = url
+        self.apikey = apikey
+        self.options = options
+        # spawn: no copy of the GTK process (threads, X connection)
+        self._mp = multiprocessing.get_context('spawn')
+        self._buf = self._mp.RawArray(ctypes.c_char, SIZE)
+        self.source = WorkerSource(self._buf)
+        self.client = WorkerClient(self)
+        self._process = None
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._calls = {}
+        self._ids = itertools.count()
+
+    def start(self):
+        self._conn, child = self._mp.Pipe()
+        self._process = self._mp.Process(target=_serve, name='octorest_worker', daemon=True,
+                                         args=(self.url, self.apikey, self.options, self._buf, child))
+        self._process.start()
+        child.close()
+        threading.Thread(target=self._receive, name='worker_replies', daemon=True).start()
+
+    @property
+    def alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def open(self):
+        """
+        Connect the worker to OctoPrint, raises the error if it cannot
+        """
+        if not self.alive:
+            self.start()
+        self.client.version = self.call(None, (), {})
+
+    def call(self, name, args, kwargs):
+        future = Future()
+        callId = next(self._ids)
+        self._calls[callId] = future
+        try:
+            with self._send_lock:
+                # Calls under critical() use the worker's reserved connection too
+                self._conn.send((callId, name, args, kwargs, getattr(_critical, 'on', False)))
+        except (OSError, ValueError) as err:
+            self._calls.pop(callId, None)
+            raise ConnectionError('Network worker is gone: {}'.format(err))
+
+        expires = getattr(_deadline, 'expires', None)
+        timeout = max(t[0] + t[1] for t in OctoRest.TIMEOUTS.values())
+        if expires is not None:
+            timeout = max(0, expires - time.monotonic())
+        try:
+            return future.result(timeout)
+        except (FutureTimeout, TimeoutError):
+            # Not the same class before Python 3.11
+            raise RequestTimeout('Network worker: {} timed out'.format(name))
+        finally:
+            self._calls.pop(callId, None)
+
+    def _receive(self):
+        # Reply reader - resolves the futures of call()
+        while True:
+            try:
+                callId, ok, value = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            future = self._calls.get(callId)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        for future in list(self._calls.values()):
+            if not future.done():
+                future.set_exception(ConnectionError('Network worker exited'))
+        log.info("Network worker - exit")
+
+    def stop(self):
+        if self._process is None:
+            return
+        try:
+            with self._send_lock:
+                self._conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self._process.join(timeout=2)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+        self._process = None
+
+###########################
+### WORKER PROCESS SIDE ###
+###########################
+
+def _open(url, apikey, options):
+    from .budget import RequestBudget
+    options = dict(options)
+    connections = options.pop('connections', 5)
+    budget = options.pop('budget', None)
+    kind = options.pop('transport', None)
+    options.pop('schedule', None)
+    client = OctoRest(url=url, apikey=apikey, transport=make_transport(kind, connections), **options)
+    client.reserve(make_transport(kind, 1))
+    if budget is not None:
+        client.budget = RequestBudget(*budget)
+    return client
+
+def _pickles(err):
+    # Exceptions go back over the pipe - fall back to the message
+    try:
+        return type(err)(*err.args) if err.args else err
+    except Exception:
+        return RuntimeError(str(err))
+
+class _Worker:
+    def __init__(self, url, apikey, options, buf, conn):
+        self.url = url
+        self.apikey = apikey
+        self.options = options
+        self.schedule = dict(SCHEDULE, **options.get('schedule', {}))
+        self.snapshot = SharedSnapshot(buf)
+        self.conn = conn
+        self.client = None
+        self.error = None
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.pool = ThreadPoolExecutor(max_workers=options.get('connections', 5),
+                                       thread_name_prefix='worker_call')
+        # Calls under critical() - not queued behind the others
+        self.reserved = ThreadPoolExecutor(max_workers=1, thread_name_prefix='worker_critical')
+
+    def reply(self, callId, ok, value):
+        try:
+            with self.send_lock:
+                self.conn.send((callId, ok, value))
+        except Exception as err:
+            # Result does not pickle
+            with self.send_lock:
+                self.conn.send((callId, False, RuntimeError(str(err))))
+
+    def handle(self, callId, name, args, kwargs, reserved=False):
+        try:
+            with self.lock:
+                if name is None or self.client is None:
+                    if self.client is None:
+                        self.client = _open(self.url, self.apikey, self.options)
+                    if name is None:
+                        self.reply(callId, True, self.client.version)
+                        return
+            if reserved:
+                with critical():
+                    result = getattr(self.client, name)(*args, **kwargs)
+            else:
+                result = getattr(self.client, name)(*args, **kwargs)
+        except Exception as err:
+            self.reply(callId, False, _pickles(err))
+            return
+        self.reply(callId, True, result)
+
+    def commands(self):
+        while True:
+            try:
+                msg = self.conn.recv()
+            except (EOFError, OSError):
+                msg = None
+            if msg is None:
+                self.stopped.set()
+                return
+            (self.reserved if msg[4] else self.pool).submit(self.handle, *msg)
+
+    def poll(self):
+        slices = {}
+        due = dict.fromkeys(SCHEDULE, 0.0)
+        failures = 0
+        while not self.stopped.is_set():
+            client = self.client
+            if client is None:
+                self.stopped.wait(0.5)
+                continue
+
+            now = time.monotonic()
+            failed = False
+            with background():
+                if now >= due['printer'] and now >= due['job'] and client.has_status():
+                    # All due - one request with the status plugin
+                    try:
+                        status = client.status()
+                    except Exception as err:
+                        status = dict.fromkeys(('connection', 'printer', 'job'), err)
+                    for name, value in status.items():
+                        _keep(slices, name, value)
+                    failed = _failed(status['connection'])
+                    due['printer'] = now + self.schedule['printer']
+                    due['connection'] = now + self.schedule['connection']
+                    due['job'] = now + (self.schedule['job'] if _busy(slices.get('printer')) else JOB_IDLE)
+                if now >= due['printer']:
+                    due['printer'] = now + self.schedule['printer']
+                    try:
+                        slices['printer'] = client.printer(exclude=['sd'])
+                        slices['connection'] = slices['printer']['state']['text']
+                        due['connection'] = now + self.schedule['connection']
+                    except Exception as err:
+                        _keep(slices, 'printer', err)
+                if now >= due['connection']:
+                    due['connection'] = now + self.schedule['connection']
+                    try:
+                        slices['connection'] = client.state()
+                    except Exception as err:
+                        _keep(slices, 'connection', err)
+                        failed = _failed(err)
+                if now >= due['job'] and not failed:
+                    due['job'] = now + (self.schedule['job'] if _busy(slices.get('printer')) else JOB_IDLE)
+                    try:
+                        slices['job'] = client.job_info()
+                    except Exception as err:
+                        _keep(slices, 'job', err)
+            self.snapshot.write(encode(slices))
+
+            if failed:
+                # Unreachable - poll less often until it answers again
+                failures += 1
+                wait = min(RETRY_CAP, self.schedule['connection'] * 2 ** failures)
+                due = dict.fromkeys(SCHEDULE, time.monotonic() + wait)
+            else:
+                failures = 0
+            self.stopped.wait(max(0.05, min(due.values()) - time.monotonic()))
+
+def _keep(slices, name, value):
+    # Throttled requests did not run - keep the previous value
+    if not isinstance(value, RequestThrottled):
+        slices[name] = value
+
+def _failed(value):
+    # Failed connection poll - not one held back by the budget
+    return isinstance(value, Exception) and not isinstance(value, RequestThrottled)
+
+def _busy(printer):
+    # Printing, paused or pausing - job progress changes
+    flags = printer['state']['flags'] if isinstance(printer, dict) else {}
+    return flags.get('printing') or flags.get('paused') or flags.get('pausing')
+
+def _serve(url, apikey, options, buf, conn):
+    # Worker process entry point
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s worker %(levelname)s %(message)s')
+    worker = _Worker(url, apikey, options, buf, conn)
+    threading.Thread(target=worker.commands, name='worker_commands', daemon=True).start()
+    worker.poll()
+    worker.pool.shutdown(wait=False)
+
+#################
+### BENCHMARK ###
+#################
+
+def _frames(seconds, period=1 / 30, work=0.004):
+    # Main loop stand-in - lateness (sec) of each frame doing 'work' sec of CPU
+    lateness = []
+    due = time.monotonic() + period
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        time.sleep(max(0, due - time.monotonic()))
+        lateness.append(max(0, time.monotonic() - due))
+        spin = time.perf_counter() + work
+        while time.perf_counter() < spin:
+            pass
+        due += period
+    return sorted(lateness)
+
+def _report(mode, lateness, polls):
+    pct = lambda p: 1000 * lateness[min(len(lateness) - 1, int(p / 100 * len(lateness)))]
+    print('{:10s} frames {:5d}  p50 {:6.2f}ms  p95 {:6.2f}ms  p99 {:6.2f}ms  max {:6.2f}ms  polls {:d}'
+          .format(mode, len(lateness), pct(50), pct(95), pct(99), 1000 * lateness[-1], polls))
+
+def main(argv):
+    if len(argv) < 2:
+        print(__doc__)
+        return 2
+    url, apikey = argv[:2]
+    seconds = float(argv[2]) if len(argv) > 2 else 20
+
+    # In-process: the store's requests on a thread of the UI process
+    client = _open(url, apikey, {})
+    stop = threading.Event()
+    polls = [0]
+
+    def poller():
+        while not stop.wait(0.25):
+            client.printer(exclude=['sd'])
+            client.job_info()
+            polls[0] += 1
+    thread = threading.Thread(target=poller, daemon=True)
+    thread.start()
+    lateness = _frames(seconds)
+    stop.set()
+    thread.join()
+    _report('in-process', lateness, polls[0])
+
+    # Worker: snapshot reads only, at the same rate
+    worker = NetworkWorker(url, apikey, schedule={'printer': 0.25, 'job': 0.25})
+    worker.open()
+    stop.clear()
+    polls[0] = 0
+
+    def reader():
+        while not stop.wait(0.25):
+            if worker.source.is_live:
+                worker.source.printer(exclude=['sd'])
+                worker.source.job_info()
+                polls[0] += 1
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    lateness = _frames(seconds)
+    stop.set()
+    thread.join()
+    worker.stop()
+    _report('worker', lateness, polls[0])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,6 +1,8 @@
 # Misc control functions and OctoPrint user defined commands and controls
 
-from octopyclient.common import CommonPanel, Singleton
+from functools import partial
+
+from octopyclient.common import CommonPanel, Singleton, gcodePriority
 from octopyclient.utils import *
 from octopyclient.igtk import *
 
@@ -94,10 +96,8 @@ class ControlPanel(CommonPanel, metaclass=Singleton):
 
     def execSystemCommand(self, source, command):
         log.info("Executing system command: {}".format(command['name']))
-        try:
-            self.ui.printer.execute_system_command('custom', command['action'])
-        except Exception as err:
-            log.error("Command {:s} failed: {}".format(command['name'], str(err)))
+        self.ui.command("Command {:s} failed".format(command['name']),
+                        partial(self.ui.printer.execute_system_command, 'custom', command['action']))
 
     def askCommand(self, source, cmd):
         confirmDialog(self, fixupHTML(cmd['confirm']), self.execCommand, cmd)
@@ -108,8 +108,6 @@ class ControlPanel(CommonPanel, metaclass=Singleton):
             cmd = list(control['commands'])
         else:
             cmd = control['command']
-        try:
-            self.ui.printer.gcode(cmd)
-        except Exception as err:
-            log.error("Command {:s} failed: {}".format(control['name'], str(err)))
+        self.ui.command("Command {:s} failed".format(control['name']),
+                        partial(self.ui.printer.gcode, cmd), gcodePriority(cmd))
 
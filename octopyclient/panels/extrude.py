@@ -1,11 +1,13 @@
 # Extruder / Filament functions
 
+from functools import partial
+
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 
 from octopyclient.utils import *
-from octopyclient.common import CommonPanel, Singleton, BackgroundTask
+from octopyclient.common import CommonPanel, Singleton, takeResult
 from octopyclient.igtk import *
 
 from .temperature import TemperaturePanel, EXTRUDE_MIN_TEMP
@@ -26,7 +28,7 @@ class ExtrudePanel(CommonPanel, metaclass=Singleton):
         self.toolImages = {}
         self.ttempData = {}
         self.last = ''
-        self.bkgnd = BackgroundTask("extruder_update", 5, self.updateTemp, ui)
+        self.bkgnd = ui.store.subscribe("extruder_update", self.updateTemp, 'printer')
 
         self.g.attach(self.createExtrudeButton("Extrude", "extrude", 1), 0, 0, 1, 1)
         self.g.attach(self.createExtrudeButton("Retract", "retract", -1), 3, 0, 1, 1)
@@ -51,6 +53,9 @@ class ExtrudePanel(CommonPanel, metaclass=Singleton):
     def doExtrude(self, pb, dir):
         if pb.released:
             return False
+        # Previous extrude not done yet - skip this tick
+        if pb.pending:
+            return True
 
         # Wait for some valid data
         if not self.ttempData:
@@ -68,11 +73,7 @@ class ExtrudePanel(CommonPanel, metaclass=Singleton):
 
         amount = dir * self.amount.steps[self.amount.idx][1]
         log.info("Filament extrude ({:s}): {:d}mm".format(self.tool.steps[self.tool.idx][0], amount))
-        try:
-            self.ui.printer.extrude(amount)
-        except Exception as err:
-            log.error("Extrude request: {}".format(str(err)))
-            return False
+        self.ui.command("Extrude request", partial(self.ui.printer.extrude, amount), button=pb)
 
         return True
 
@@ -88,22 +89,21 @@ class ExtrudePanel(CommonPanel, metaclass=Singleton):
         if tool != self.last:
             log.info("Changing tool to: {:s}".format(tool))
             self.tool.b.set_image(self.toolImages[tool][1])
-            try:
-                self.ui.printer.tool_select(tool)
-            except Exception as err:
-                log.error("Tool select: {}".format(str(err)))
+            self.ui.command("Tool select", partial(self.ui.printer.tool_select, tool))
             if self.last:
                 self.toolImages[self.last][0].b.set_sensitive(False)
             self.toolImages[tool][0].b.set_sensitive(True)
         self.last = tool
 
-    def updateTemp(self):
+    def updateTemp(self, snapshot):
         try:
-            toolTemps = self.ui.printer.tool()
+            printer_state = takeResult(snapshot['printer'])
         except Exception as err:
             log.error("Getting tool temps: {}".format(str(err)))
             return
 
+        toolTemps = {k: v for k, v in printer_state['temperature'].items() if k.startswith('tool')}
+
         for tool in toolTemps:
             if tool not in self.toolImages:
                 self.addNewTool(tool)
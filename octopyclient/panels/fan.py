@@ -1,3 +1,5 @@
+from functools import partial
+
 from octopyclient.utils import *
 from octopyclient.common import CommonPanel, Singleton
 from octopyclient.igtk import *
@@ -29,7 +31,5 @@ class FanPanel(CommonPanel, metaclass=Singleton):
 
     def setFanSpeed(self, button, speed):
         log.debug("Setting fans speed: {:d} %".format(speed))
-        try:
-            self.ui.printer.gcode("M106 S{:d}".format(int(255 * speed / 100)))
-        except Exception as err:
-            log.error("Fan speed request: {}".format(str(err)))
+        self.ui.command("Fan speed request",
+                        partial(self.ui.printer.gcode, "M106 S{:d}".format(int(255 * speed / 100))))
@@ -97,8 +97,8 @@ class FilesPanel(CommonPanel, metaclass=Singleton):
             log.error("Retrieving files: {}".format(str(err)))
             return
 
-        # Sort latest first
-        files.sort(key=byDate, reverse=True)
+        # Sort latest first (copy - listing may be shared, see OctoRest._get)
+        files = sorted(files, key=byDate, reverse=True)
         # Remove previous list items from container
         emptyContainer(self.list)
         # Folders first
@@ -1,3 +1,5 @@
+from functools import partial
+
 from octopyclient.utils import *
 from octopyclient.common import CommonPanel, Singleton
 from octopyclient.igtk import *
@@ -20,9 +22,6 @@ class HomePanel(CommonPanel, metaclass=Singleton):
 
     def homeRequest(self, source, axes):
         log.debug("Homing {} axes".format(axes))
-        try:
-            self.ui.printer.home(axes)
-        except Exception as err:
-            log.error("Homing axes: {}".format(str(err)))
+        self.ui.command("Homing axes", partial(self.ui.printer.home, axes))
 
  
\ No newline at end of file
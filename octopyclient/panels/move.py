@@ -1,5 +1,7 @@
 # Print head move panel
 
+from functools import partial
+
 from octopyclient.utils import *
 from octopyclient.common import CommonPanel, Singleton
 from octopyclient.igtk import *
@@ -35,19 +37,15 @@ class MovePanel(CommonPanel, metaclass=Singleton):
         # Cancel timer if released
         if pb.released:
             return False
+        # Previous move not done yet - skip this tick
+        if pb.pending:
+            return True
 
         step_value = self.step.steps[self.step.idx][1]
         dist = float(step_value * vect[1])
-        try:
-            if vect[0] == 'x':
-                self.ui.printer.jog(x=dist)
-            elif vect[0] == 'y':
-                self.ui.printer.jog(y=dist)
-            elif vect[0] == 'z':
-                self.ui.printer.jog(z=dist)
-        except Exception as err:
-            log.error("Move {}={}: {}".format(vect[0], vect[1], str(err)))
-            return False
+        if vect[0] in ('x', 'y', 'z'):
+            self.ui.command("Move {}={}".format(vect[0], vect[1]),
+                            partial(self.ui.printer.jog, **{vect[0]: dist}), button=pb)
 
         return True
 
@@ -56,7 +54,4 @@ class MovePanel(CommonPanel, metaclass=Singleton):
         return ButtonImageScaled("Home All", "home.svg", IMAGE_SIZE_NORMAL, self.doHomeAll)
 
     def doHomeAll(self, source):
-        try:
-            self.ui.printer.home({'x', 'y', 'z'})
-        except Exception as err:
-            log.error("Home all: {}".format(str(err)))
+        self.ui.command("Home all", partial(self.ui.printer.home, {'x', 'y', 'z'}))
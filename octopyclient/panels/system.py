@@ -1,3 +1,5 @@
+from functools import partial
+
 import humanize
 import os
 import psutil
@@ -122,7 +124,5 @@ class SystemPanel(CommonPanel, metaclass=Singleton):
         confirmDialog(self, "Execute {:s} command?".format(name), doSystemCommand, source)
 
 def doSystemCommand(panel, button):
-    try:
-        panel.ui.printer.execute_system_command('core', button.get_name())
-    except Exception as err:
-        log.error("Execute system command: {}".format(str(err)))
+    panel.ui.command("Execute system command",
+                     partial(panel.ui.printer.execute_system_command, 'core', button.get_name()))
@@ -1,7 +1,9 @@
 # Select pre-heat based on material type
 
+from functools import partial
+
 from octopyclient.utils import *
-from octopyclient.common import CommonPanel, Singleton, BackgroundTask
+from octopyclient.common import CommonPanel, Singleton, takeResult, gcodePriority
 from octopyclient.igtk import *
 
 # Minimum temperature to allow extruder / filament operations
@@ -64,7 +66,7 @@ class TemperaturePanel(CommonPanel, metaclass=Singleton):
         CommonPanel.__init__(self, ui)
         log.debug("TemperaturePanel created")
         self.panelH = 2
-        self.bkgnd = BackgroundTask("tools_update", 1, self.updateToolData, ui)
+        self.bkgnd = ui.store.subscribe("tools_update", self.updateToolData, 'printer')
 
         self.g.attach(self.createChangeButton("Increase", "increase.svg", 1), 0, 0, 1, 1)
         self.g.attach(self.createChangeButton("Decrease", "decrease.svg", -1), 3, 0, 1, 1)
@@ -103,11 +105,14 @@ class TemperaturePanel(CommonPanel, metaclass=Singleton):
             self.unload.set_sensitive(True)
 
         self.tool.b.set_image(self.toolImages[self.tool.steps[self.tool.idx][1]])
-        self.updateToolData()
+        self.showToolData()
 
     def doChangeTarget(self, pb, direction):
         if pb.released:
             return False
+        # Previous target not sent yet - skip this tick
+        if pb.pending:
+            return True
 
         tool = self.tool.steps[self.tool.idx][1]
         target = self.getToolTarget(tool)
@@ -118,31 +123,29 @@ class TemperaturePanel(CommonPanel, metaclass=Singleton):
         if target < 0:
             return False
         log.info("Setting target temperature for {:s} to {:1f}".format(tool, target))
-        self.setTarget(tool, target)
+        self.setTarget(tool, target, pb)
         return True
 
     def getToolTarget(self, tool):
+        # Read from last state update
+        if not self.ttempData:
+            # No temperature data
+            return 0
         try:
-            printer_state = self.ui.printer.printer(exclude=['sd', 'state'])
-            if printer_state['temperature']:
-                return printer_state['temperature'][tool]['target']
-        except Exception as err:
-            if type(err) is IndexError:
-                log.error("Cannot find tool: {:s}".format(tool))
-            else:
-                log.error("Getting current temp: {}".format(str(err)))
+            return self.ttempData[tool]['target']
+        except KeyError:
+            log.error("Cannot find tool: {:s}".format(tool))
             return -1
-        # No temperature data
-        return 0
 
-    def setTarget(self, tool, target):
-        try:
-            if tool == 'bed':
-                self.ui.printer.bed_target(target)
-            else:
-                self.ui.printer.tool_target(target)
-        except Exception as err:
-            log.error("Setting temp for: {:s} to {:.0f} - {}".format(tool, target, str(err)))
+    def setTarget(self, tool, target, button=None):
+        what = "Setting temp for: {:s} to {:.0f}".format(tool, target)
+        if tool == 'bed':
+            self.ui.command(what, partial(self.ui.printer.bed_target, target), button=button)
+        else:
+            self.ui.command(what, partial(self.ui.printer.tool_target, target), button=button)
+        # Keep repeated changes consistent until next update
+        if tool in self.ttempData:
+            self.ttempData[tool]['target'] = target
 
     def showProfile(self, source):
         self.ui.OpenPanel(ProfilePanel(self.ui, self), self)
@@ -163,14 +166,18 @@ class TemperaturePanel(CommonPanel, metaclass=Singleton):
         addStep(self.tool, ("", name))
         self.changeTool()
 
-    def updateToolData(self):
+    def updateToolData(self, snapshot):
         try:
-            printer_state = self.ui.printer.printer(exclude=['sd', 'state'])
+            printer_state = takeResult(snapshot['printer'])
         except Exception as err:
             log.error("Getting current state: {}".format(str(err)))
             return
 
-        self.ttempData = printer_state['temperature']
+        # Private copy - targets are updated locally (see: setTarget)
+        self.ttempData = {k: dict(v) for k, v in printer_state['temperature'].items()}
+        self.showToolData()
+
+    def showToolData(self):
         for tool in self.ttempData:
             # Ignore Prusa PINDA('P') and ambient('A') temps
             if tool == 'A' or tool == 'P':
@@ -217,7 +224,4 @@ class TemperaturePanel(CommonPanel, metaclass=Singleton):
             log.error("Extruder pre-heat required")
             return
 
-        try:
-           self.ui.printer.gcode(cmds)
-        except Exception as err:
-            log.error("GCode rejected: {}".format(str(err)))
+        self.ui.command("GCode rejected", partial(self.ui.printer.gcode, cmds), gcodePriority(cmds))
@@ -1,5 +1,7 @@
 # Controls available when printing
 
+from functools import partial
+
 from octopyclient.common import CommonPanel, Singleton
 from .panels.extrude import ExtrudePanel
 from .panels.temperature import TemperaturePanel
@@ -45,9 +47,6 @@ class PrintMenuPanel(CommonPanel, metaclass=Singleton):
         self.ui.OpenPanel(MovePanel(self.ui), self)
 
     def changeFlowrate(self):
-        try:
-            factor = self.frb.steps[self.frb.idx][1]
-            log.info("Changing flowrate to: {:d}%".format(factor))
-            self.ui.printer.flowrate(factor)
-        except Exception as err:
-            log.error("Setting flowrate: {}".format(str(err)))
+        factor = self.frb.steps[self.frb.idx][1]
+        log.info("Changing flowrate to: {:d}%".format(factor))
+        self.ui.command("Setting flowrate", partial(self.ui.printer.flowrate, factor))
@@ -7,7 +7,7 @@ import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 
-from octopyclient.common import CommonPanel, Singleton, BackgroundTask
+from octopyclient.common import CommonPanel, Singleton, takeResult, USER, CRITICAL
 from .print_menu import PrintMenuPanel
 from octopyclient.igtk import *
 from octopyclient.utils import *
@@ -21,7 +21,7 @@ class PrintStatusPanel(CommonPanel, metaclass=Singleton):
         CommonPanel.__init__(self, ui)
         log.debug("PrintStatusPanel created")
 
-        self.bkgnd = BackgroundTask("print_status", 1, self.update, ui)
+        self.bkgnd = ui.store.subscribe("print_status", self.update, 'printer', 'job')
 
         self.g.attach(self.createInfoBox(), 1, 0, 3, 1)
         self.g.attach(self.createProgressBar(), 1, 1, 3, 1)
@@ -121,21 +121,24 @@ class PrintStatusPanel(CommonPanel, metaclass=Singleton):
         if self.ui.pState == "Cancelling":
             log.warning("Job is cancelling")
             return
+        log.warning("Pausing/Resuming job")
+        self.ui.executor.run({'toggle': self.ui.printer.toggle}, self.pauseDone, priority=USER)
+
+    def pauseDone(self, results):
         try:
-            log.warning("Pausing/Resuming job")
-            self.ui.printer.toggle()
+            takeResult(results['toggle'])
         except Exception as err:
             log.error(str(err))
         finally:
-            self.updateTemperature()
+            self.bkgnd.queueIt()
 
-    def update(self):
-        self.updateTemperature()
-        self.updateJob()
+    def update(self, snapshot):
+        self.updateTemperature(snapshot['printer'])
+        self.updateJob(snapshot['job'])
 
-    def updateTemperature(self):
+    def updateTemperature(self, result):
         try:
-            printer_state = self.ui.printer.printer(exclude=['sd'])
+            printer_state = takeResult(result)
         except Exception as err:
             if isRemoteDisconnect(err):
                 log.debug("Ignoring remote disconnect")
@@ -194,9 +197,9 @@ class PrintStatusPanel(CommonPanel, metaclass=Singleton):
                 self.stop.set_sensitive(False)
                 return
 
-    def updateJob(self):
+    def updateJob(self, result):
         try:
-            job_state = self.ui.printer.job_info()
+            job_state = takeResult(result)
         except Exception as err:
             if isRemoteDisconnect(err):
                 log.debug("Ignoring remote disconnect")
@@ -268,11 +271,13 @@ def confirmStopDialog(panel, printer):
 
     ctx = dlg.get_style_context()
     ctx.add_class("dialog")
+    panel.ui.store.hold()
     try:
         if dlg.run() == Gtk.ResponseType.YES:
             log.warning("Stopping current job")
-            printer.cancel()
+            panel.ui.command("Stop job", printer.cancel, CRITICAL)
     except Exception as err:
         log.error(str(err))
     finally:
         dlg.destroy()
+        panel.ui.store.release()
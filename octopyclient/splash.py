@@ -5,6 +5,7 @@ gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk
 
 from octopyclient.common import CommonPanel
+from octopyclient.connection import CONNECTING, PROBING, BACKOFF, PRINTER_CONNECTING, PRINTER_OFFLINE
 from .panels.system import SystemPanel
 from octopyclient.igtk import *
 
@@ -33,6 +34,19 @@ class SplashPanel(CommonPanel):
         box.add(self.createActionBar())
 
         self.g.add(box)
+        ui.connection.listen(self.connectionChanged)
+
+    def connectionChanged(self, state, reason):
+        if state == CONNECTING:
+            self.label.set_text("Connecting to OctoPrint...")
+        elif state == PROBING:
+            self.label.set_text("Checking OctoPrint...")
+        elif state == BACKOFF:
+            self.label.set_text(reason)
+        elif state == PRINTER_CONNECTING:
+            self.label.set_text("Connecting to printer...")
+        elif state == PRINTER_OFFLINE:
+            self.label.set_text("Printer not connected: " + reason)
 
     def createActionBar(self):
         bar = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
@@ -64,6 +78,8 @@ class SplashPanel(CommonPanel):
         ctx.add_class("hidden")
         self.label.set_text("Startup...")
         self.ui.connectionAttempts = 0
+        self.ui.connection.reset()
+        self.ui.bkgnd.start()
 
     def showSystem(self, source):
         self.ui.OpenPanel(SystemPanel(self.ui), self)
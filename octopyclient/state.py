@@ -0,0 +1,387 @@
+# Shared printer state - one poller, many subscribers
+
+import time
+import socket
+import threading
+from functools import partial
+from urllib.parse import urlparse
+
+import psutil
+
+from octopyclient.common import BackgroundTask, AsyncBackgroundTask, RequestShed, takeResult
+from octopyclient.octorest.octorest import OctoRest, background
+from octopyclient.octorest.budget import RequestThrottled
+from octopyclient.utils import *
+
+# Poller tick (sec) - slice intervals are multiples of this
+STATE_TICK = 1
+# Bound on the total time (sec) of one tick's requests
+STATE_DEADLINE = 4
+
+# Poll intervals (sec) per printer phase (see: StateStore.phase).
+# Slices not listed are not fetched in that phase.
+SCHEDULE = {
+    'offline':  {'connection': 2},
+    'idle':     {'connection': 4, 'printer': 4},
+    'heating':  {'connection': 2, 'printer': 2},
+    'printing': {'connection': 2, 'printer': 1, 'job': 2},
+    'paused':   {'connection': 2, 'printer': 2, 'job': 5},
+}
+
+# Active panel overrides - None: static panel, nothing is polled.
+# A slice is fetched at least this often, also in phases that do
+# not fetch it (except offline).
+PANEL_SCHEDULE = {
+    'TemperaturePanel': {'printer': 1},
+    'ExtrudePanel':     {'printer': 2},
+    # Last job and progress shown while idle too
+    'PrintStatusPanel': {'job': 5},
+    'HomePanel':        None,
+    'FanPanel':         None,
+    'MovePanel':        None,
+    'ControlPanel':     None,
+    'SystemPanel':      None,
+}
+
+# Share of the request budget per subscriber (when a budget is set)
+BUDGET_SHARES = {
+    'state_check': 0.2,
+    'temperature_update': 0.3,
+    'print_status': 0.5,
+    'tools_update': 0.3,
+    'extruder_update': 0.2,
+}
+DEFAULT_SHARE = 0.2
+
+# Poll interval control: intervals are scaled by a factor between
+# MIN_FACTOR and MAX_FACTOR, adjusted every CONTROL_PERIOD seconds
+CONTROL_PERIOD = 5
+MIN_FACTOR = 0.5
+MAX_FACTOR = 4.0
+RTT_HIGH = 0.5          # Tick round-trip (sec) - back off above
+RTT_LOW = 0.15          # - speed up below
+ERROR_HIGH = 0.2        # Failed request ratio - back off above
+CPU_HIGH = 60.0         # OctoPrint process CPU (% of one core) - back off above
+CPU_LOW = 30.0          # - speed up below
+
+def _background(request):
+    # Executor thread - request is subject to the client's budget
+    with background():
+        return request()
+
+class Subscription():
+    # Same start/cancel interface as BackgroundTask so panels
+    # can use it as their 'bkgnd'. How often the slices are
+    # fetched is set by the store's schedule.
+    def __init__(self, store, name, callback, slices):
+        self.store = store
+        self.name = name
+        self.callback = callback
+        self.slices = set(slices)
+        self.share = BUDGET_SHARES.get(name, DEFAULT_SHARE)
+
+    def start(self, source=None):
+        self.store.add(self)
+        self.queueIt()
+
+    def cancel(self):
+        self.store.remove(self)
+
+    def queueIt(self):
+        # Refresh as soon as possible
+        self.store.refresh(self.slices)
+
+class PollControl():
+    # Stretch poll intervals when OctoPrint is slow, failing or busy,
+    # tighten them again when it recovers (multiplicative both ways)
+    def __init__(self, host):
+        self.factor = 1.0
+        self.rtt = None
+        self.requests = 0
+        self.errors = 0
+        self.last = time.monotonic()
+        parsed = urlparse(host)
+        self.local = parsed.scheme == 'unix' or \
+            parsed.hostname in ('localhost', '127.0.0.1', '::1', socket.gethostname())
+        self.proc = None
+        self.lookup = 0.0
+
+    def sample(self, rtt, requests, errors):
+        # Smoothed tick round-trip time and error counts since last update
+        self.rtt = rtt if self.rtt is None else 0.8 * self.rtt + 0.2 * rtt
+        self.requests += requests
+        self.errors += errors
+        if time.monotonic() - self.last >= CONTROL_PERIOD:
+            self.update()
+
+    def octoprintCPU(self):
+        # Co-located only - CPU % of the OctoPrint process (None if unknown)
+        if not self.local:
+            return None
+        try:
+            if self.proc is None:
+                # Process scan is expensive - at most once a minute
+                if time.monotonic() - self.lookup < 60:
+                    return None
+                self.lookup = time.monotonic()
+                for p in psutil.process_iter(['cmdline']):
+                    if any('octoprint' in arg.lower() for arg in (p.info['cmdline'] or [])[:2]):
+                        self.proc = p
+                        # First reading is always 0.0
+                        p.cpu_percent()
+                        return None
+                return None
+            return self.proc.cpu_percent()
+        except psutil.Error:
+            self.proc = None
+            return None
+
+    def update(self):
+        errorRate = self.errors / self.requests if self.requests else 0.0
+        cpu = self.octoprintCPU()
+        overloaded = (self.rtt > RTT_HIGH or errorRate > ERROR_HIGH
+                      or (cpu is not None and cpu > CPU_HIGH))
+        idle = (self.rtt < RTT_LOW and self.errors == 0
+                and (cpu is None or cpu < CPU_LOW))
+
+        factor = self.factor
+        if overloaded:
+            factor = min(MAX_FACTOR, factor * 1.5)
+        elif idle:
+            factor = max(MIN_FACTOR, factor * 0.8)
+        elif factor < 1.0:
+            # Not clearly idle - no faster than requested
+            factor = 1.0
+        if factor != self.factor:
+            log.info("Poll interval factor: {:.2f} (rtt {:.0f}ms, errors {:.0%}, OctoPrint CPU {})"
+                     .format(factor, 1000 * self.rtt, errorRate, "n/a" if cpu is None else "{:.0f}%".format(cpu)))
+            self.factor = factor
+
+        self.requests = 0
+        self.errors = 0
+        self.last = time.monotonic()
+
+class StateStore():
+    # Slices: 'connection' (state text), 'printer' (/api/printer w/o SD) and 'job'
+    def __init__(self, ui):
+        self.ui = ui
+        self.snapshot = {}
+        self.subs = []
+        self.due = {}
+        self.held = 0
+        self.lock = threading.Lock()
+        self.printerOk = False
+        self.running = False
+        # Request rate statistics
+        self.requests = 0
+        self.window = time.time()
+        self.control = PollControl(ui._host)
+        self.started = None
+        # Slices due when a status plugin request was sent
+        self.status = set()
+        task = AsyncBackgroundTask if ui.config.aio else BackgroundTask
+        self.bkgnd = task('state_store', STATE_TICK, self.complete, ui, self.request, STATE_DEADLINE)
+
+    def subscribe(self, name, callback, *slices):
+        return Subscription(self, name, callback, slices)
+
+    def add(self, sub):
+        with self.lock:
+            if sub not in self.subs:
+                self.subs.append(sub)
+        if not self.running:
+            self.running = True
+            self.bkgnd.start()
+
+    def remove(self, sub):
+        with self.lock:
+            if sub in self.subs:
+                self.subs.remove(sub)
+
+    def refresh(self, slices):
+        # Fetch slices on the next tick
+        with self.lock:
+            for name in slices:
+                self.due[name] = 0.0
+        self.bkgnd.queueIt()
+
+    def hold(self):
+        # Stop polling while a modal dialog covers the screen (nests)
+        self.held += 1
+
+    def release(self):
+        self.held -= 1
+        if self.held == 0:
+            self.bkgnd.queueIt()
+
+    def get(self, name):
+        # Last value of a slice - raises the last request error if it failed
+        try:
+            return takeResult(self.snapshot[name])
+        except KeyError:
+            raise RuntimeError("No {:s} data".format(name))
+
+    def phase(self):
+        # Printer phase keying the schedule: offline, idle, heating, printing, paused
+        state = self.snapshot.get('connection')
+        if self.ui.printer is None or not isinstance(state, str):
+            return 'offline'
+        if state in ["Pausing", "Paused"]:
+            return 'paused'
+        if isPrinting(state):
+            return 'printing'
+        if not isOperational(state):
+            return 'offline'
+        printer = self.snapshot.get('printer')
+        if isinstance(printer, dict):
+            if any(t.get('target') for t in printer.get('temperature', {}).values()):
+                return 'heating'
+        return 'idle'
+
+    def schedule(self):
+        # {slice: interval} for the current phase and active panel
+        phase = self.phase()
+        table = dict(SCHEDULE[phase])
+        panel = type(self.ui._current).__name__
+        if panel in PANEL_SCHEDULE:
+            override = PANEL_SCHEDULE[panel]
+            if override is None:
+                return {}
+            for name, interval in override.items():
+                if name in table:
+                    table[name] = min(table[name], interval)
+                elif phase != 'offline':
+                    table[name] = interval
+        return table
+
+    def period(self, name, interval, subs):
+        # Slice interval - scaled by the poll controller and stretched so each
+        # subscriber stays within its share of the budget (one request per slice)
+        budget = self.ui.config.budget
+        if budget is not None:
+            share = max(s.share / len(s.slices) for s in subs)
+            interval = max(interval, 1 / (share * budget[0]))
+        return max(STATE_TICK, interval * self.control.factor)
+
+    def request(self):
+        # Timer thread - build one set of requests for the slices due
+        if self.held:
+            return {}
+        now = time.time()
+        table = self.schedule()
+        with self.lock:
+            subs = list(self.subs)
+            slices = set()
+            for name, interval in table.items():
+                wanted = [s for s in subs if name in s.slices]
+                if wanted and now >= self.due.get(name, 0.0):
+                    slices.add(name)
+                    self.due[name] = now + self.period(name, interval, wanted) - STATE_TICK / 2
+        if not slices:
+            return {}
+
+        source = self.ui.statusSource()
+        # REST polling - not a push or worker snapshot
+        rest = source is None or source is self.ui.printer
+        if rest and not self.ui.connection.allow():
+            # Backing off - OctoPrint is not reachable
+            return {}
+        if source is None:
+            # Not connected yet - open client (returns client and state)
+            requests = {'connection': self.ui.connection.open}
+        else:
+            requests = {}
+            # Printer state text is part of /api/printer while connected
+            if 'connection' in slices:
+                if self.printerOk:
+                    slices.add('printer')
+                else:
+                    requests['connection'] = source.state
+            if 'printer' in slices:
+                requests['printer'] = partial(source.printer, exclude=['sd'])
+            if 'job' in slices:
+                requests['job'] = source.job_info
+            # Status plugin - one request for all of them (see: complete)
+            if rest and len(requests) > 1 and isinstance(source, OctoRest) and source.has_status():
+                self.status = set(requests)
+                requests = {'status': source.status}
+
+        if rest:
+            self.count(len(requests))
+            requests = {k: partial(_background, r) for k, r in requests.items()}
+            self.started = time.monotonic()
+        else:
+            self.started = None
+        return requests
+
+    def count(self, n):
+        self.requests += n
+        elapsed = time.time() - self.window
+        if elapsed >= 60:
+            log.info("State store: {:.0f} requests/min".format(self.requests * 60 / elapsed))
+            if self.ui.printer is not None:
+                # Not on the poller - one call, to the network worker if used
+                self.ui.executor.submit(partial(self.report, self.ui.printer))
+            self.requests = 0
+            self.window = time.time()
+
+    def report(self, printer):
+        # Executor thread - log client statistics of the last minute
+        try:
+            stats = printer.monitor_stats(reset=True)
+        except Exception as err:
+            log.debug("Statistics: {}".format(str(err)))
+            return
+        transport = stats['transport']
+        if transport:
+            log.info("Transport: {:d} connections for {:d} requests ({:.0%} reused), {:d} reaped"
+                     .format(transport['connections'], transport['requests'], transport['reuse'], transport['reaped']))
+            if transport.get('tls_handshakes'):
+                log.info("TLS: {:d} handshakes ({:d} resumed), {:.0f}ms total"
+                         .format(transport['tls_handshakes'], transport['tls_resumed'], 1000 * transport['tls_time']))
+        log.info("OctoRest: {}".format(stats['counters']))
+        dns = stats['dns']
+        log.info("DNS: {:d} failed, resolution times {}".format(dns['failures'], ", ".join(
+            "<{:g}s: {:d}".format(b, n) for b, n in dns['histogram'].items() if n)))
+        log.info("Scheduler: {:s}".format(self.ui.executor.stats()))
+        for endpoint, (n, wire, size) in sorted(stats['wire'].items()):
+            log.info("Wire: {:s} {:d} replies, {:.1f}KB on wire, {:.1f}KB decoded"
+                     .format(endpoint, n, wire / 1024, size / 1024))
+
+    def complete(self, results):
+        conn = results.get('connection')
+        if isinstance(conn, tuple):
+            client, results['connection'] = conn
+            self.ui.connection.opened(client)
+
+        if 'status' in results:
+            # One status plugin request - keep the slices that were due
+            status = results.pop('status')
+            for name in self.status:
+                results[name] = status if isinstance(status, Exception) else status[name]
+
+        # REST round-trip of this tick - not counting requests that never ran
+        if self.started is not None:
+            sent = {k: v for k, v in results.items() if not isinstance(v, (RequestShed, RequestThrottled))}
+            if sent:
+                errors = sum(1 for v in sent.values() if isinstance(v, Exception))
+                self.control.sample(time.monotonic() - self.started, len(sent), errors)
+                self.ui.connection.record(sent)
+
+        if 'printer' in results:
+            printer = results['printer']
+            self.printerOk = not isinstance(printer, Exception)
+            if self.printerOk and 'connection' not in results:
+                results['connection'] = printer['state']['text']
+
+        # Shed or throttled requests did not run - keep the previous values
+        self.snapshot.update({k: v for k, v in results.items()
+                              if not isinstance(v, (RequestShed, RequestThrottled))})
+
+        # Notify subscribers of refreshed slices once all their slices arrived
+        updated = set(results)
+        with self.lock:
+            subs = list(self.subs)
+        for s in subs:
+            if s.slices & updated and s.slices <= set(self.snapshot):
+                s.callback(self.snapshot)
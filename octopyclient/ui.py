@@ -3,15 +3,19 @@ import sdnotify
 
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, Gdk
+from gi.repository import Gtk, Gdk, GLib
 
-from octopyclient.common import BackgroundTask, LogHandler, Config
-from .octorest.octorest import OctoRest
+from octopyclient.common import LogHandler, Config, RestExecutor, LatencyStats, takeResult, USER
+from octopyclient.state import StateStore
+from octopyclient.connection import ConnectionManager
 from .splash import SplashPanel
 from .idle_status import IdleStatusPanel
 from .print_status import PrintStatusPanel
 from octopyclient.utils import *
 
+# Main loop probe interval (ms) - its lateness is the UI frame latency
+PROBE_INTERVAL = 100
+
 ''' Test wapper for serializing OctoPrint API calls
 class OPClient():
     opclient:   OctoRest
@@ -43,21 +47,6 @@ class OPClient():
             return orig_attr
 '''
 
-def open_client(url, key):
-    try:
-        # Create custom Session object with keep-alive disabled
-        # Supossedly OctoPrint REST API always closes connections.
-        import requests
-        sess = requests.Session()
-        sess.keep_alive = False
-        client = OctoRest(url=url, apikey=key, session=sess)
-        # client = OPClient(url, key, sess)
-        return client, None
-    except Exception as err:
-        msg = errToUser(err)
-        log.error(msg)
-        return None, msg
-
 class UI(Gtk.Window):
     _rundown = []       # Background timer threads to cancel
     _backtrack = []     # Navigation history for 'back' buttons
@@ -92,8 +81,6 @@ class UI(Gtk.Window):
 
         # Navigation backup fence
         self._backtrack.append(None)
-        self.now = int(time.time())
-        self.printer = None
         self.pprofile = {}
         self.connectionAttempts = 0
         self.UIState = None
@@ -101,11 +88,23 @@ class UI(Gtk.Window):
         # Add pop-up notifications
         self.notify = LogHandler()
         log.addHandler(self.notify)
-        # Keep systemd happy
+        # Keep systemd happy - main loop liveness, polling may be paused
         self.n = sdnotify.SystemdNotifier()
+        GLib.timeout_add_seconds(2, self.watchdog)
+        # Main loop latency, logged every minute (debug)
+        self.frames = LatencyStats("Main loop", every=60000 // PROBE_INTERVAL)
+        self.probeDue = time.monotonic() + PROBE_INTERVAL / 1000
+        GLib.timeout_add(PROBE_INTERVAL, self.probe)
+        # OctoRest requests run off the main loop
+        self.executor = RestExecutor()
+        # Owns the OctoRest client (see: printer)
+        self.connection = ConnectionManager(self)
+
+        # Shared printer state poller
+        self.store = StateStore(self)
 
         self.sp = SplashPanel(self)
-        self.bkgnd = BackgroundTask('state_check', 2, self.update, self)
+        self.bkgnd = self.store.subscribe('state_check', self.update, 'connection')
 
         css_provider = Gtk.CssProvider()
         css_provider.load_from_path(style_sheet)
@@ -129,6 +128,13 @@ class UI(Gtk.Window):
         o.add(self.g)
         o.add_overlay(self.notify.nBox)
 
+    @property
+    def printer(self):
+        return self.connection.client
+
+    def statusSource(self):
+        return self.connection.statusSource()
+
     def isSharedNozzle(self):
         if not self.pprofile:
             self.pprofile = self.printer.printer_profile()
@@ -157,6 +163,8 @@ class UI(Gtk.Window):
         # Kill timer threads before exit
         for t in self._rundown:
             t.cancel()
+        self.connection.stop()
+        self.executor.shutdown()
         Gtk.main_quit()
 
     def Remove(self, p):
@@ -180,60 +188,57 @@ class UI(Gtk.Window):
             # Open default panel if top or explicit return
             self.OpenPanel(IdleStatusPanel(self))
 
-    def update(self):
-        if self.connectionAttempts > 8:
-            return
-        elif self.UIState == "splash":
+    def update(self, snapshot):
+        if self.UIState == "splash":
             self.connectionAttempts += 1
             if self.connectionAttempts > 8:
+                # Stop polling until 'Retry'
+                self.bkgnd.cancel()
                 self.sp.putOnHold()
+                return
         else:
             self.connectionAttempts = 0
 
         self.verifyConnection()
 
-    def verifyConnection(self):
+    def watchdog(self):
         self.n.notify("WATCHDOG=1")
+        return True
 
-        newUiState = "splash"
-        splashMessage = "Initializing..."
-
-        # Connect if not open yet
-        if self.printer is None:
-            self.printer, errMsg = open_client(self._host, self.config.api_key)
+    def probe(self):
+        now = time.monotonic()
+        self.frames.add(max(0.0, now - self.probeDue))
+        self.probeDue = now + PROBE_INTERVAL / 1000
+        return True
 
-        if self.printer is not None:
-            try:
-                self.pState = self.printer.state()
-                if isOperational(self.pState):
-                    newUiState = "idle"
-                    if self.UIState == "printing":
-                        self.UIState = newUiState
-                elif isPrinting(self.pState):
-                    newUiState = "printing"
-                elif isError(self.pState):
-                    pass
-                elif isOffline(self.pState):
-                    log.info("Attempting to connect to printer")
-                    self.printer.connect()
-                    newUiState = "splash"
-                    splashMessage = "Startup..."
-                elif isConnecting(self.pState):
-                    splashMessage = "Printer state: " + self.pState + "..."
-            except Exception as err:
-                # After 10sec - display reason
-                if (int(time.time()) - self.now) > 10:
-                    splashMessage = errToUser(err)
-                    newUiState = "splash"
-                elif not isRemoteDisconnect(err):
-                    log.error("Getting printer state: {}".format(errToUser(err)))
-                else:
-                    log.debug("Ignoring remote disconnect")
-        else:
-            # Print connect retry
-            splashMessage = errMsg
+    def verifyConnection(self):
+        newUiState = "splash"
+        # Connection problems are reported by the connection manager
+        splashMessage = None
 
-        self.sp.label.set_text(splashMessage)
+        try:
+            self.pState = self.store.get('connection')
+            if isOperational(self.pState):
+                newUiState = "idle"
+                self.connection.printerReady()
+                if self.UIState == "printing":
+                    self.UIState = newUiState
+            elif isPrinting(self.pState):
+                newUiState = "printing"
+                self.connection.printerReady()
+            elif isError(self.pState):
+                splashMessage = "Printer state: " + self.pState
+            elif isOffline(self.pState):
+                self.connection.connectPrinter()
+                newUiState = "splash"
+            elif isConnecting(self.pState):
+                splashMessage = "Printer state: " + self.pState + "..."
+        except Exception as err:
+            if self.printer is not None and not isRemoteDisconnect(err):
+                log.debug("Getting printer state: {}".format(errToUser(err)))
+
+        if splashMessage is not None:
+            self.sp.label.set_text(splashMessage)
 
         if newUiState == self.UIState:
             return
@@ -246,7 +251,28 @@ class UI(Gtk.Window):
                     log.info("Printing a job")
                     self.OpenPanel(PrintStatusPanel(self))
             elif newUiState == "splash":
-                self.now = int(time.time())
                 self.OpenPanel(self.sp)
         finally:
             self.UIState = newUiState
+
+    def command(self, what, request, priority=USER, button=None):
+        # Printer command - queued ahead of status polling, does not block
+        # the main loop. Failures are logged as '<what>: <error>'.
+        # For a held button (PressedButton): pending until it completes,
+        # its repeat ticks are skipped meanwhile so requests do not pile up
+        if button is None:
+            self.executor.run({what: request}, self.commandDone, priority=priority)
+            return
+        button.pending = True
+
+        def done(results):
+            button.pending = False
+            self.commandDone(results)
+        self.executor.run({what: request}, done, priority=priority)
+
+    def commandDone(self, results):
+        for what, result in results.items():
+            try:
+                takeResult(result)
+            except Exception as err:
+                log.error("{:s}: {}".format(what, str(err)))
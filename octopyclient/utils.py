@@ -48,7 +48,9 @@ def imagePath(iname):
 def errToUser(err):
     starting = ["Request canceled", "Connection aborted", "(404)"]
     text = str(err)
-    if "Connection refused" in text:
+    if isinstance(err, TimeoutError):
+        return "OctoPrint not responding - request timed out"
+    elif "Connection refused" in text:
         return "Unable to connect to OctoPrint - is it running?"
     elif "Name or service not known" in text:
         return "OctoPrint server not found - check address"
@@ -134,11 +136,14 @@ def confirmDialog(panel, msg, cb, param):
 
     ctx = dlg.get_style_context()
     ctx.add_class("dialog")
+    # No polling while the dialog covers the screen
+    panel.ui.store.hold()
     try:
         if dlg.run() == Gtk.ResponseType.OK:
             cb(panel, param)
     finally:
         dlg.destroy()
+        panel.ui.store.release()
 
 def fixupHTML(msg):
     # replace 'strong' with 'b'
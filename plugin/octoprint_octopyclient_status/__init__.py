@@ -0,0 +1,52 @@
+# OctoPyClient status - one API endpoint for the touchscreen client
+#
+#   GET /api/plugin/octopyclient_status
+#
+# Merged printer state, temperatures, job and progress: the fields the
+# OctoPyClient panels show, instead of /api/printer, /api/job and
+# /api/connection. 'temperature' is null while the printer is not
+# operational (when /api/printer answers 409 Conflict).
+
+import flask
+import octoprint.plugin
+from octoprint.access.permissions import Permissions
+
+# Fields of the current job and progress sent
+JOB_FIELDS = ('lastPrintTime',)
+FILE_FIELDS = ('name',)
+PROGRESS_FIELDS = ('completion', 'printTime', 'printTimeLeft')
+
+def pick(data, fields):
+    data = data or {}
+    return {k: data.get(k) for k in fields}
+
+class StatusPlugin(octoprint.plugin.SimpleApiPlugin):
+    def is_api_protected(self):
+        return True
+
+    def on_api_get(self, request):
+        if not Permissions.STATUS.can():
+            flask.abort(403)
+
+        current = self._printer.get_current_data()
+        state = current.get('state') or {}
+
+        temperature = None
+        if self._printer.is_operational():
+            temperature = {}
+            for heater, temp in self._printer.get_current_temperatures().items():
+                temperature[heater] = {'actual': temp.get('actual'), 'target': temp.get('target')}
+
+        job = current.get('job') or {}
+        info = pick(job, JOB_FIELDS)
+        info['file'] = pick(job.get('file'), FILE_FIELDS)
+
+        return flask.jsonify(state={'text': state.get('text'), 'flags': state.get('flags')},
+                             temperature=temperature,
+                             job=info,
+                             progress=pick(current.get('progress'), PROGRESS_FIELDS))
+
+__plugin_name__ = "OctoPyClient Status"
+__plugin_description__ = "Aggregated status endpoint for the OctoPyClient touchscreen client"
+__plugin_pythoncompat__ = ">=3,<4"
+__plugin_implementation__ = StatusPlugin()
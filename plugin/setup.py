@@ -0,0 +1,16 @@
+from setuptools import setup
+
+# OctoPrint plugin - install into OctoPrint's environment:
+#    $ ~/oprint/bin/pip install ./plugin
+# and restart OctoPrint
+
+setup(
+    name="OctoPrint-OctoPyClientStatus", version="1.0.0",
+    packages=['octoprint_octopyclient_status'],
+    install_requires=["OctoPrint>=1.4.0"],
+    author="Ted Hess", author_email="thess@kitschensync.net", license="MIT",
+    url="https://github.com/thess/OctoPyClient",
+    description="Aggregated status endpoint for the OctoPyClient touchscreen client",
+    entry_points={'octoprint.plugin': ['octopyclient_status = octoprint_octopyclient_status']},
+    python_requires='>=3.6'
+    )
@@ -39,7 +39,16 @@ INSTALL_REQUIRES = [
 # [testing repo]
 #    $ pip install --index-url https://test.pypi.org/simple/ --no-cache-dir --no-deps octopyclient
 
-EXTRAS_REQUIRE = {}
+EXTRAS_REQUIRE = {
+    # Push updates from OctoPrint (falls back to polling if missing)
+    "push": ["websocket-client"],
+    # Status from the OctoPrint-MQTT plugin (--mqtt)
+    "mqtt": ["paho-mqtt"],
+    # AsyncOctoRest (asyncio client)
+    "async": ["aiohttp"],
+    # Faster JSON decoding of OctoRest replies
+    "fastjson": ["orjson"]
+}
 
 version = re.search('^__version__\\s*=\\s*"(.*)"',
                     open('octopyclient/octopyclient.py').read(), re.M).group(1)
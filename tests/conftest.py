@@ -0,0 +1,26 @@
+# Headless test runs - a stand-in for PyGObject when it is not installed.
+# Only covers what the modules do with gi at import time, nothing is drawn.
+
+import sys
+import types
+
+class _Stub(type):
+    # Any attribute is another stub class, which instances accept as well
+    def __getattr__(cls, name):
+        stub = _Stub(name, (), {'__getattr__': lambda self, attr: getattr(type(self), attr),
+                                '__init__': lambda self, *args, **kwargs: None})
+        setattr(cls, name, stub)
+        return stub
+
+try:
+    import gi
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gtk
+except (ImportError, ValueError):
+    gi = types.ModuleType('gi')
+    gi.require_version = lambda namespace, version: None
+    repository = types.ModuleType('gi.repository')
+    repository.__getattr__ = lambda name: getattr(_Stub('repository', (), {}), name)
+    gi.repository = repository
+    sys.modules['gi'] = gi
+    sys.modules['gi.repository'] = repository
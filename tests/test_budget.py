@@ -0,0 +1,131 @@
+# Request budget: token refill, in-flight slots, background-only throttling
+
+import threading
+
+import pytest
+
+from octopyclient.octorest import budget as budgetmod
+from octopyclient.octorest.budget import RequestBudget, RequestThrottled, RetryBudget
+from octopyclient.octorest.octorest import OctoRest, background
+from octopyclient.octorest.memory import MemoryTransport
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(budgetmod.time, 'monotonic', clock)
+    return clock
+
+def test_tokens_refill_at_rate(clock):
+    budget = RequestBudget(2, inflight=10, burst=2)
+    assert budget.acquire() and budget.acquire()
+    assert not budget.acquire()
+    clock.now += 0.5
+    assert budget.acquire()
+    assert not budget.acquire()
+    assert budget.throttled == 2
+
+def test_refill_capped_by_burst(clock):
+    budget = RequestBudget(2, inflight=10, burst=3)
+    clock.now += 60
+    assert all(budget.acquire() for _ in range(3))
+    assert not budget.acquire()
+
+def test_inflight_released(clock):
+    budget = RequestBudget(100, inflight=1)
+    assert budget.acquire()
+    assert not budget.acquire()
+    budget.release()
+    assert budget.acquire()
+
+def test_commands_charged_not_refused(clock):
+    budget = RequestBudget(1, inflight=10, burst=1)
+    budget.charge()
+    budget.charge()
+    # Two commands left the balance at -1: background waits 2s
+    clock.now += 1.5
+    assert not budget.acquire()
+    clock.now += 0.5
+    assert budget.acquire()
+
+def test_retry_budget():
+    retries = RetryBudget(ratio=0.5, reserve=1)
+    assert retries.withdraw()
+    assert not retries.withdraw()
+    retries.deposit()
+    assert not retries.withdraw()
+    retries.deposit()
+    assert retries.withdraw()
+
+def client():
+    transport = MemoryTransport({'/api/version': {'api': '0.1'}, '/api/job': {'state': 'Operational'},
+                                 ('POST', '/api/job'): (204, None)})
+    octo = OctoRest(url='http://octopi', apikey='test', transport=transport)
+    octo.budget = RequestBudget(1, inflight=1, burst=1)
+    return octo, transport
+
+def test_only_background_requests_throttled():
+    octo, transport = client()
+    with background():
+        octo.job_info()
+        with pytest.raises(RequestThrottled):
+            octo.job_info()
+    # Not background - sent despite the empty budget
+    octo.job_info()
+    octo.start()
+    assert octo.counters['throttled'] == 1
+    assert transport.requests == 4
+
+def test_background_slot_released_after_reply():
+    octo, transport = client()
+    octo.budget = RequestBudget(100, inflight=1)
+    with background():
+        for _ in range(3):
+            octo.job_info()
+    assert octo.counters['throttled'] == 0
+
+def test_throttled_leader_not_shared():
+    # A user GET waiting on a throttled background GET of the same path
+    # sends its own request instead of failing with RequestThrottled
+    octo, transport = client()
+    waiting = threading.Event()
+    go = threading.Event()
+
+    class Budget(RequestBudget):
+        def acquire(self):
+            waiting.set()
+            go.wait(5)
+            return False
+    octo.budget = Budget(1)
+
+    leader = {}
+    def poll():
+        with background():
+            try:
+                octo.job_info()
+            except Exception as err:
+                leader['error'] = err
+    thread = threading.Thread(target=poll)
+    thread.start()
+    waiting.wait(5)
+
+    follower = {}
+    def user():
+        follower['result'] = octo.job_info()
+    user = threading.Thread(target=user)
+    user.start()
+    while octo.counters['single_flight_saved'] == 0:
+        user.join(0.01)
+    go.set()
+    thread.join(5)
+    user.join(5)
+
+    assert isinstance(leader['error'], RequestThrottled)
+    assert follower['result'] == {'state': 'Operational'}
+    assert octo.counters['single_flight_resent'] == 1
@@ -0,0 +1,82 @@
+# OctoRest retry policy against a stand-in server (MemoryTransport)
+
+import ssl
+
+import pytest
+
+from octopyclient.octorest.octorest import OctoRest, RequestTimeout
+from octopyclient.octorest.budget import RetryBudget
+from octopyclient.octorest.memory import MemoryTransport
+
+def client(routes):
+    transport = MemoryTransport(dict(routes, **{'/api/version': {'api': '0.1'}}))
+    client = OctoRest(url='http://octopi', apikey='test', transport=transport)
+    client.RETRY_BACKOFF = 0
+    client.counters.clear()
+    transport.requests = 0
+    return client, transport
+
+def failing(*replies):
+    # Route answering replies in turn, then 200 OK
+    replies = list(replies)
+
+    def reply(method, path, params, body):
+        if replies:
+            reply = replies.pop(0)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+        return {'ok': True}
+    return reply
+
+def test_get_retried_on_gateway_error():
+    octo, transport = client({'/api/job': failing((503, None), (502, None))})
+    assert octo.job_info() == {'ok': True}
+    assert transport.requests == 3
+    assert octo.counters['retry'] == 2
+    assert octo.counters['retry_ok'] == 1
+
+def test_get_retried_on_connection_error():
+    octo, transport = client({'/api/job': failing(ConnectionError('reset'))})
+    assert octo.job_info() == {'ok': True}
+    assert transport.requests == 2
+
+def test_retries_are_limited():
+    octo, transport = client({'/api/job': (503, None)})
+    with pytest.raises(RuntimeError):
+        octo.job_info()
+    assert transport.requests == 1 + OctoRest.RETRIES
+    assert octo.counters['retry_exhausted'] == 1
+
+def test_post_not_retried():
+    octo, transport = client({'/api/job': failing((503, None))})
+    with pytest.raises(RuntimeError):
+        octo.start()
+    assert transport.requests == 1
+    assert octo.counters['retry_unsafe'] == 1
+
+def test_tls_error_not_retried():
+    octo, transport = client({'/api/job': failing(ssl.SSLError('bad certificate'))})
+    with pytest.raises(ssl.SSLError):
+        octo.job_info()
+    assert transport.requests == 1
+
+def test_timeout_not_retried():
+    octo, transport = client({'/api/job': failing(TimeoutError('read timed out'))})
+    with pytest.raises(RequestTimeout):
+        octo.job_info()
+    assert transport.requests == 1
+    assert octo.counters['timeout'] == 1
+
+def test_retry_budget_charged():
+    octo, transport = client({'/api/job': (503, None)})
+    # One retry saved, requests add none
+    octo.retry_budget = RetryBudget(ratio=0, reserve=1)
+    with pytest.raises(RuntimeError):
+        octo.job_info()
+    assert transport.requests == 2
+    assert octo.counters['retry_budget'] == 1
+    with pytest.raises(RuntimeError):
+        octo.job_info()
+    assert transport.requests == 3
+    assert octo.counters['retry_budget'] == 2
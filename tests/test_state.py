@@ -0,0 +1,112 @@
+# StateStore poll schedule against a stand-in OctoPrint (MemoryTransport)
+
+from octopyclient.octorest.octorest import OctoRest
+from octopyclient.octorest.memory import MemoryTransport
+from octopyclient.octorest.push import state_flags
+from octopyclient.state import StateStore
+
+# Only the class name of the active panel is looked up
+class PrintStatusPanel:
+    pass
+
+class TemperaturePanel:
+    pass
+
+class HomePanel:
+    pass
+
+class Config:
+    aio = False
+    budget = None
+
+class Connection:
+    def allow(self):
+        return True
+
+    def record(self, results):
+        pass
+
+class UI:
+    def __init__(self, client, panel):
+        self._host = 'http://octopi'
+        self.config = Config()
+        self.connection = Connection()
+        self.executor = None
+        self.printer = client
+        self._current = panel
+
+    def addRundown(self, task):
+        pass
+
+    def statusSource(self):
+        return self.printer
+
+def octoprint(state):
+    # Stand-in server: printer in 'state', no heater target, no status plugin
+    printer = {'state': {'text': state, 'flags': state_flags(state)},
+               'temperature': {'tool0': {'actual': 25.0, 'target': 0.0, 'offset': 0},
+                               'bed': {'actual': 24.0, 'target': 0.0, 'offset': 0}}}
+    routes = {
+        '/api/version': {'api': '0.1', 'server': '1.9.3'},
+        '/api/connection': {'current': {'state': state}},
+        '/api/printer': printer if state == 'Operational' else (409, b'Printer is not operational'),
+        '/api/job': {'job': {'file': {'name': 'benchy.gcode'}, 'lastPrintTime': 1234.5},
+                     'progress': {'completion': 100.0, 'printTime': 1234, 'printTimeLeft': 0},
+                     'state': state},
+    }
+    transport = MemoryTransport(routes)
+    return OctoRest(url='http://octopi', apikey='test', transport=transport), transport
+
+def store(state, panel):
+    client, transport = octoprint(state)
+    store = StateStore(UI(client, panel()))
+    # Subscribers are added without starting the store's timer
+    store.running = True
+    updates = []
+    store.add(store.subscribe('state_check', lambda snapshot: None, 'connection'))
+    store.add(store.subscribe('print_status', updates.append, 'printer', 'job'))
+    return store, transport, updates
+
+def ticks(store, n=3):
+    # Run n poll ticks, every slice due
+    for _ in range(n):
+        store.due.clear()
+        results = {}
+        for name, request in store.request().items():
+            try:
+                results[name] = request()
+            except Exception as err:
+                results[name] = err
+        store.complete(results)
+
+def paths(transport):
+    return [path for method, path, params, body in transport.sent]
+
+def test_print_status_polls_job_while_idle():
+    state, transport, updates = store('Operational', PrintStatusPanel)
+    ticks(state)
+    assert state.phase() == 'idle'
+    assert '/api/job' in paths(transport)
+    assert updates and updates[-1]['job']['job']['file']['name'] == 'benchy.gcode'
+
+def test_other_panels_skip_job_while_idle():
+    state, transport, updates = store('Operational', TemperaturePanel)
+    # The status plugin probe falls back to all three endpoints once
+    ticks(state)
+    probed = len(transport.sent)
+    ticks(state)
+    assert state.phase() == 'idle'
+    assert '/api/printer' in paths(transport)[probed:]
+    assert '/api/job' not in paths(transport)[probed:]
+
+def test_no_job_while_offline():
+    state, transport, updates = store('Closed', PrintStatusPanel)
+    ticks(state)
+    assert state.phase() == 'offline'
+    assert '/api/job' not in paths(transport)
+
+def test_static_panel_polls_nothing():
+    state, transport, updates = store('Operational', HomePanel)
+    sent = transport.requests
+    ticks(state)
+    assert transport.requests == sent
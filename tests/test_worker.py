@@ -0,0 +1,115 @@
+# Network worker: shared snapshot seqlock and the call timeout path
+
+import pytest
+
+from octopyclient.octorest import worker
+from octopyclient.octorest.octorest import RequestTimeout, deadline
+from octopyclient.octorest.worker import SIZE, SharedSnapshot, WorkerSource, NetworkWorker, encode
+
+def printing(completion):
+    return {'connection': 'Printing',
+            'printer': {'state': {'text': 'Printing', 'flags': {'operational': True, 'printing': True}},
+                        'temperature': {'tool0': {'actual': 209.5, 'target': 210.0, 'offset': 0}}},
+            'job': {'job': {'file': {'name': 'benchy.gcode'}},
+                    'progress': {'completion': completion, 'printTime': 60, 'printTimeLeft': None}}}
+
+def test_snapshot_round_trip():
+    buf = bytearray(SIZE)
+    source = WorkerSource(buf)
+    assert source.snapshot.read() == (None, 0)
+    SharedSnapshot(buf).write(encode(printing(10.0)))
+
+    assert source.state() == 'Printing'
+    assert source.printer()['state']['flags']['printing']
+    assert source.tool() == {'tool0': {'actual': 209.5, 'target': 210.0, 'offset': 0}}
+    assert source.job_info()['progress']['completion'] == 10.0
+    assert source.job_info()['progress']['printTimeLeft'] is None
+    assert source.is_live
+
+def test_failed_slice_raises():
+    buf = bytearray(SIZE)
+    SharedSnapshot(buf).write(encode({'connection': 'Operational', 'printer': RuntimeError('409')}))
+    source = WorkerSource(buf)
+    assert source.state() == 'Operational'
+    with pytest.raises(RuntimeError, match='409'):
+        source.printer()
+    with pytest.raises(RuntimeError):
+        source.job_info()
+
+class Racing:
+    # LAYOUT whose first read is overlapped by a write
+    def __init__(self, snapshot, values):
+        self.snapshot = snapshot
+        self.values = values
+        self.size = worker.LAYOUT.size
+        self.layout = worker.LAYOUT
+        self.reads = 0
+
+    def pack_into(self, *args):
+        self.layout.pack_into(*args)
+
+    def unpack_from(self, buf, offset):
+        values = self.layout.unpack_from(buf, offset)
+        self.reads += 1
+        if self.reads == 1:
+            self.snapshot.write(self.values)
+        return values
+
+def test_torn_read_retried(monkeypatch):
+    buf = bytearray(SIZE)
+    writer = SharedSnapshot(buf)
+    writer.write(encode(printing(10.0)))
+    newer = encode(printing(20.0))
+    racing = Racing(writer, newer)
+    monkeypatch.setattr(worker, 'LAYOUT', racing)
+
+    source = WorkerSource(buf)
+    # The first read saw the counter change - repeated, newer values
+    assert source.job_info()['progress']['completion'] == 20.0
+    assert racing.reads == 2
+    assert source.snapshot.read()[1] == 4
+
+def test_read_during_write_gives_up():
+    buf = bytearray(SIZE)
+    writer = SharedSnapshot(buf)
+    writer.write(encode(printing(10.0)))
+    # Writer stopped half way: counter left odd
+    worker._SEQ.pack_into(buf, 0, writer._seq + 1)
+    source = WorkerSource(buf)
+    with pytest.raises(RuntimeError):
+        source.snapshot.read()
+    assert not source.is_live
+
+def test_restarted_writer_continues_sequence():
+    buf = bytearray(SIZE)
+    SharedSnapshot(buf).write(encode(printing(10.0)))
+    writer = SharedSnapshot(buf)
+    writer.write(encode(printing(20.0)))
+    assert writer.read()[1] == 4
+
+class Pipe:
+    # Worker end that never answers
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+
+    def send(self, msg):
+        if self.error is not None:
+            raise self.error
+        self.sent.append(msg)
+
+def test_call_times_out_on_deadline():
+    network = NetworkWorker('http://octopi', 'test')
+    network._conn = Pipe()
+    with deadline(0.05):
+        with pytest.raises(RequestTimeout):
+            network.client.job_info()
+    assert network._conn.sent[0][1] == 'job_info'
+    assert network._calls == {}
+
+def test_call_to_gone_worker():
+    network = NetworkWorker('http://octopi', 'test')
+    network._conn = Pipe(BrokenPipeError('closed'))
+    with pytest.raises(ConnectionError):
+        network.client.state()
+    assert network._calls == {}